@@ -0,0 +1,353 @@
+"""
+Benchmarks of the dispatch of generic functions.
+
+Each benchmark measures the latency of calling a generic function, varying one aspect of it at a time
+from a default configuration (50 registrations, 4 arguments, lambda predicates, positional calls,
+matching the middle registration): the number of registrations, the number of arguments, the kind of
+predicates, positional or keyword calls, the position of the matching registration, and the options
+of the generic function. Plain if/elif chains and functools.singledispatch are measured as baselines,
+each with how many times slower the equivalent generic function is (lambda predicates are compared
+both to a chain inlining their conditions and to one calling the same functions the generic function does),
+throughput is measured with several threads calling concurrently, and so is the time registering
+each of many implementations takes.
+
+Results are written as JSON, so the results of two versions can be compared:
+
+    python benchmarks/bench_dispatch.py --output before.json
+    python benchmarks/bench_dispatch.py --output after.json
+    python benchmarks/bench_dispatch.py --compare before.json after.json
+"""
+
+from __future__ import unicode_literals, division, print_function, absolute_import
+
+import argparse
+import json
+import os
+import platform
+import sys
+import threading
+import time
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+import genericfuncs  # noqa: E402
+
+try:
+    from functools import singledispatch
+except ImportError:  # python 2, unless the singledispatch backport is installed
+    try:
+        from singledispatch import singledispatch
+    except ImportError:
+        singledispatch = None
+
+
+DEFAULTS = {
+    'registrations': 50,
+    'arity': 4,
+    'kind': 'lambda',
+    'call': 'positional',
+    'match': 'middle',
+    'mode': 'default',
+}
+
+VARIATIONS = {
+    'registrations': [1, 10, 50, 100, 500],
+    'arity': [1, 2, 4, 6, 10],
+    'kind': ['type', 'dict', 'lambda', 'bound_method', 'callable_object', 'and_list', 'type_prefix'],
+    'call': ['positional', 'keyword'],
+    'match': ['first', 'middle', 'default'],
+    'mode': ['default', 'pure'],
+}
+
+QUICK_VARIATIONS = {
+    'registrations': [1, 50],
+    'arity': [1, 4],
+    'kind': VARIATIONS['kind'],
+    'call': VARIATIONS['call'],
+    'match': VARIATIONS['match'],
+    'mode': VARIATIONS['mode'],
+}
+
+THREADS = [1, 4, 16]
+
+REGISTERED = [100, 1000, 5000]  # implementations, whose registration is measured
+
+
+def make_classes(count):
+    return [type(str('Class{}'.format(index)), (object,), {}) for index in range(count)]
+
+
+class Matcher(object):
+    def __init__(self, value):
+        self.value = value
+
+    def matches(self, a0):
+        return a0 == self.value
+
+    def __call__(self, a0):
+        return a0 == self.value
+
+
+def make_equals(value):
+    return lambda a0: a0 == value
+
+
+def make_implementation(value):
+    return lambda: value
+
+
+def make_base_function(arity):
+    arg_names = ['a{}'.format(index) for index in range(arity)]
+    namespace = {}
+    exec('def base({}):\n    return -1\n'.format(', '.join(arg_names)), namespace)
+    return namespace['base'], arg_names
+
+
+def make_generic(config):
+    """Return a generic function built by the configuration, and the positional arguments of the measured call."""
+    size, kind = config['registrations'], config['kind']
+    base, arg_names = make_base_function(config['arity'])
+    options = {'pure': config['mode'] == 'pure', 'cache_size': None}
+    func = genericfuncs.generic(base, **options)
+    classes = make_classes(size)
+
+    for index in range(size):
+        if kind == 'type':
+            func.when(classes[index])(make_implementation(index))
+        elif kind == 'dict':
+            predicate = {'a0': make_equals(index)}
+            predicate.update((name, int) for name in arg_names[1:])
+            func.when(predicate)(make_implementation(index))
+        elif kind == 'lambda':
+            func.when(make_equals(index))(make_implementation(index))
+        elif kind == 'bound_method':
+            func.when(Matcher(index).matches)(make_implementation(index))
+        elif kind == 'callable_object':
+            func.when(Matcher(index))(make_implementation(index))
+        elif kind == 'and_list':
+            func.when([{'a0': int}, make_equals(index)])(make_implementation(index))
+        elif kind == 'type_prefix':
+            func.when(make_equals(index), type={'a0': int})(make_implementation(index))
+        else:
+            raise ValueError('Unknown predicate kind: {}'.format(kind))
+
+    match_index = {'first': 0, 'middle': size // 2, 'default': None}[config['match']]
+    if kind == 'type':
+        value = classes[match_index]() if match_index is not None else object()
+        args = (value,) * config['arity']
+    else:
+        args = (match_index if match_index is not None else -1,) + (0,) * (config['arity'] - 1)
+
+    expected = match_index if match_index is not None else -1
+    return func, arg_names, args, expected
+
+
+def make_if_elif_chain(config, calling=False):
+    """Return a handwritten-like equivalent of make_generic()'s function for lambda and type predicates.
+    If `calling` is True, lambda predicates and implementations are called like the generic function does,
+    rather than inlined.
+    """
+    size = config['registrations']
+    _, arg_names = make_base_function(config['arity'])
+    classes = make_classes(size)
+    lines = ['def chain({}):'.format(', '.join(arg_names))]
+    for index in range(size):
+        keyword = 'if' if index == 0 else 'elif'
+        if config['kind'] == 'type':
+            condition = ' and '.join('isinstance({}, classes[{}])'.format(name, index) for name in arg_names)
+        elif calling:
+            condition = 'predicates[{}](a0)'.format(index)
+        else:
+            condition = 'a0 == {}'.format(index)
+        outcome = 'implementations[{}]()'.format(index) if calling else index
+        lines.append('    {} {}:\n        return {}'.format(keyword, condition, outcome))
+    lines.append('    return -1')
+
+    namespace = {'classes': classes, 'predicates': [make_equals(index) for index in range(size)],
+                 'implementations': [make_implementation(index) for index in range(size)]}
+    exec('\n'.join(lines) + '\n', namespace)
+    return namespace['chain'], classes
+
+
+def measure(call, repeat, number=None):
+    """Return the best time per call in nanoseconds."""
+    timer = timeit.Timer(call)
+    if number is None:
+        number, _ = timer.autorange() if hasattr(timer, 'autorange') else (10000, None)
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def run_latency(config, repeat):
+    func, arg_names, args, expected = make_generic(config)
+    if config['call'] == 'keyword':
+        kwargs = dict(zip(arg_names, args))
+        assert func(**kwargs) == expected
+        return measure(lambda: func(**kwargs), repeat)
+    else:
+        assert func(*args) == expected
+        return measure(lambda: func(*args), repeat)
+
+
+def run_throughput(config, threads, calls_per_thread):
+    func, _, args, expected = make_generic(config)
+    assert func(*args) == expected
+
+    def worker():
+        for _ in range(calls_per_thread):
+            func(*args)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.time()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return threads * calls_per_thread / (time.time() - start)
+
+
+def run_registration(config, size):
+    """Return the time per registration in nanoseconds, registering `size` implementations, then calling once."""
+    config = dict(config, registrations=size)
+    start = time.time()
+    func, _, args, expected = make_generic(config)
+    assert func(*args) == expected
+    return (time.time() - start) / size * 1e9
+
+
+def run_baselines(repeat, variations):
+    """Measure the baselines, each with the latency of the equivalent generic function, and their ratio."""
+    results = []
+    for size in variations['registrations']:
+        for kind, calling in (('lambda', False), ('lambda', True), ('type', False)):
+            config = dict(DEFAULTS, registrations=size, kind=kind, arity=1 if kind == 'type' else DEFAULTS['arity'])
+            chain, classes = make_if_elif_chain(config, calling)
+            if kind == 'type':
+                args = (classes[size // 2](),)
+            else:
+                args = (size // 2,) + (0,) * (config['arity'] - 1)
+            assert chain(*args) == size // 2
+            results.append(result('if_elif_calls' if calling else 'if_elif_chain', config,
+                                  measure(lambda: chain(*args), repeat), generic_ns_per_call=run_latency(config, repeat)))
+
+        if singledispatch is not None:
+            config = dict(DEFAULTS, registrations=size, kind='type', arity=1)
+            classes = make_classes(size)
+            dispatcher = singledispatch(lambda a0: -1)
+            for index, cls in enumerate(classes):
+                dispatcher.register(cls)(lambda a0, index=index: index)
+            value = classes[size // 2]()
+            assert dispatcher(value) == size // 2
+            results.append(result('singledispatch', config, measure(lambda: dispatcher(value), repeat)))
+    return results
+
+
+def result(benchmark, config, ns_per_call=None, calls_per_second=None, generic_ns_per_call=None, **extra_params):
+    params = dict(config, **extra_params)
+    if ns_per_call is not None:
+        calls_per_second = 1e9 / ns_per_call
+    else:
+        ns_per_call = 1e9 / calls_per_second
+    entry = {'benchmark': benchmark, 'params': params,
+             'ns_per_call': round(ns_per_call, 1), 'calls_per_second': round(calls_per_second, 1)}
+    if generic_ns_per_call is not None:  # of a baseline: how many times slower the generic function is
+        entry['generic_ns_per_call'] = round(generic_ns_per_call, 1)
+        entry['generic_ratio'] = round(generic_ns_per_call / ns_per_call, 2)
+    return entry
+
+
+def print_ratios(results):
+    for entry in results:
+        if 'generic_ratio' in entry:
+            params = entry['params']
+            print('{} predicates, {} registrations: generic {:.0f} ns, {:.1f}x {} ({:.0f} ns)'.format(
+                params['kind'], params['registrations'], entry['generic_ns_per_call'], entry['generic_ratio'],
+                entry['benchmark'], entry['ns_per_call']), file=sys.stderr)
+
+
+def run(quick=False):
+    variations = QUICK_VARIATIONS if quick else VARIATIONS
+    repeat = 3 if quick else 5
+    results = []
+
+    for aspect, values in sorted(variations.items()):
+        for value in values:
+            config = dict(DEFAULTS, **{aspect: value})
+            results.append(result('generic_latency', config, run_latency(config, repeat), varied=aspect))
+            print('.', end='', file=sys.stderr)
+            sys.stderr.flush()
+
+    for threads in THREADS:
+        calls_per_second = run_throughput(DEFAULTS, threads, 2000 if quick else 20000)
+        results.append(result('generic_throughput', DEFAULTS, calls_per_second=calls_per_second, threads=threads))
+
+    for size in REGISTERED[:2] if quick else REGISTERED:
+        results.append(result('generic_registration', DEFAULTS, run_registration(DEFAULTS, size), registered=size))
+
+    results.extend(run_baselines(repeat, variations))
+    print(file=sys.stderr)
+    print_ratios(results)
+
+    return {
+        'metadata': {
+            'python': platform.python_implementation() + ' ' + platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'quick': quick,
+        },
+        'results': results,
+    }
+
+
+def result_key(entry):
+    return entry['benchmark'], json.dumps(entry['params'], sort_keys=True)
+
+
+def compare(before_path, after_path, threshold):
+    """Print the change of each benchmark between two result files.
+    Returns whether any benchmark got slower by more than the threshold (a fraction).
+    """
+    with open(before_path) as before_file, open(after_path) as after_file:
+        before = dict((result_key(entry), entry) for entry in json.load(before_file)['results'])
+        after = dict((result_key(entry), entry) for entry in json.load(after_file)['results'])
+
+    regressed = False
+    for key in sorted(set(before) & set(after)):
+        ratio = after[key]['ns_per_call'] / before[key]['ns_per_call']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressed = True
+        benchmark, params = key
+        print('{:>10.1f} -> {:>10.1f} ns  {:+7.1%}  {} {}{}'.format(
+            before[key]['ns_per_call'], after[key]['ns_per_call'], ratio - 1, benchmark, params, flag))
+
+    for key in sorted(set(before) ^ set(after)):
+        print('only in {}: {} {}'.format(before_path if key in before else after_path, *key))
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='write the results to this file as JSON, rather than to stdout')
+    parser.add_argument('--quick', action='store_true', help='measure fewer configurations, fewer times')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='compare two result files')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='slowdown fraction reported as a regression by --compare (default: 0.1)')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return 1 if compare(args.compare[0], args.compare[1], args.threshold) else 0
+
+    results = run(quick=args.quick)
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
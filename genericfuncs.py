@@ -1,10 +1,32 @@
 from __future__ import unicode_literals, division, print_function, absolute_import
 
 import collections
+import contextlib
+import copy
 import inspect
 from collections import namedtuple
+import bisect
 import functools
-from itertools import imap
+import itertools
+import operator
+import pickle
+import struct
+import sys
+import threading
+import time
+import types
+import weakref
+from abc import ABCMeta
+
+try:
+    from collections.abc import Callable, Iterable
+except ImportError:  # python 2
+    from collections import Callable, Iterable
+
+try:
+    import asyncio
+except ImportError:  # python 2
+    asyncio = None
 
 
 class generic(object):
@@ -65,28 +87,961 @@ class generic(object):
     More info about the when() decorator can be found in its docs.
     """
 
-    def __init__(self, wrapped):
-        # allow passing in ready _FunctionInfo objects
-        self._base_func = wrapped if isinstance(wrapped, _FunctionInfo) else _FunctionInfo(wrapped)
-        self._predicates_and_funcs = []
-        # functools.update_wrapper(self, wrapped)
+    def __new__(cls, wrapped=None, **options):
+        if wrapped is None:  # used as @generic(option=value)
+            return functools.partial(cls, **options)
+        return super(generic, cls).__new__(cls)
+
+    def __init__(self, wrapped, pure=False, cache_size=128, reorder_interval=1000,
+                 memoize=False, memoize_ttl=None):
+        _check_memoize_options(memoize, memoize_ttl)
+        self._base_memo = None  # the _LRUCache of the default implementation's results, see memo_info()
+        if isinstance(wrapped, _FunctionInfo):  # allow passing in ready _FunctionInfo objects
+            self._base_func = wrapped
+        elif memoize:
+            self._base_memo = _make_memo(wrapped, memoize, memoize_ttl)
+            self._base_func = _FunctionInfo(_Memoized(wrapped, self._base_memo), parameters=_Parameters.of(wrapped))
+        else:
+            self._base_func = _FunctionInfo(wrapped)
+        self._pure = pure
+        self._cache_size = cache_size
+        self._memoize = memoize  # the default of when()'s options
+        self._memoize_ttl = memoize_ttl
+        self._decision_cache_hits = self._decision_cache_misses = 0
+        self._stats = self._stats_snapshot = None
+        self._reorder_interval = reorder_interval
+        self._matches_until_reorder = reorder_interval
+        self._group_counters = {}
+        self._frozen = False
+        self._lock = threading.RLock()  # serializes changes of the registration, calls never take it
+        self._rebuilding = False
+        self._collected = False  # whether weakly held objects got collected while rebuilding
+        self._state = None
+        self._rebuild_dispatch_index(())
+        if not isinstance(wrapped, _FunctionInfo):
+            functools.update_wrapper(self, wrapped)
 
     def __call__(self, *args, **kwargs):
-        self._validate_args(args, kwargs)
+        try:
+            return self._state.call(*args, **kwargs)
+        except TypeError:
+            # the generated dispatcher takes the same arguments as the base function,
+            # so python raised this if they're wrong. Raise the error bind() does for them, if so
+            self._base_func.bind(args, kwargs)
+            raise
+
+    def __get__(self, instance, owner):
+        # bind like functions do: the instance becomes the first argument, and all instances share the dispatch
+        if instance is None:
+            return self
+        return types.MethodType(self, instance)
+
+    def __set_name__(self, owner, name):
+        # extend() copies the name of the generic method extended, so pickling by reference would find that one
+        extended = getattr(self, '__wrapped__', None)
+        if isinstance(extended, generic) and getattr(self, '__qualname__', None) == extended.__qualname__:
+            self.__name__ = name
+            self.__qualname__ = '{}.{}'.format(owner.__qualname__, name)
+            self.__module__ = owner.__module__
+
+    def extend(self):
+        """
+        Return a new generic function, or method, taking the same arguments, whose registrations are evaluated
+        before those of this one: calls matching none of them are dispatched by this one, including by
+        the implementations registered to it later. This is how a subclass overrides registrations
+        of a generic method, without changing how the instances of its base class are dispatched:
 
-        for predicate, function in self._predicates_and_funcs:
-            if predicate(*args, **kwargs):
-                return function(*args, **kwargs)
+            class Renderer(object):
+                @genericmethod
+                def render(self, node):
+                    raise TypeError()
 
-        return self._base_func(*args, **kwargs)
+                @render.when(Image)
+                def _image(self, node):
+                    return '<img src="{}">'.format(node.url)
 
-    def _validate_args(self, args, kwargs):
-        if any(kwarg not in self._base_func.args for kwarg in kwargs):
-            raise ValueError('One or more keyword arguments don\'t exist in the generic function.')
-        if len(args) > len(self._base_func.args):
-            raise ValueError('Received too many positional arguments.')
+            class TextRenderer(Renderer):
+                render = Renderer.render.extend()
+
+                @render.when(Image)  # chosen over Renderer's for TextRenderer instances
+                def _image(self, node):
+                    return node.alt_text
+
+        An extension assigned in a class body takes the name it's assigned to (from Python 3.6 on),
+        so it's pickled by reference like the generic method it extends.
+        """
+        extended = type(self)(_FunctionInfo(self, parameters=self._base_func.parameters),
+                              pure=self._pure, cache_size=self._cache_size,
+                              reorder_interval=self._reorder_interval,
+                              memoize=self._memoize, memoize_ttl=self._memoize_ttl)
+        functools.update_wrapper(extended, self, updated=())
+        return extended
+
+    def _dispatch(self, state, values):
+        """Choose the implementation for the given argument values and invoke it, by the given state's selectors."""
+        if state.decision_cache is not None:
+            return self._choose_cached(state, values)(values)
+        if state.dispatch_on_types:
+            return self._get_selector(state, _classes_at(state.typed_positions, values))(values)(values)
+        return state.select(values)(values)
+
+    def _choose(self, state, values):
+        """Return the implementation chosen for the given argument values, by the given state's selectors."""
+        if state.decision_cache is not None:
+            return self._choose_cached(state, values)
+        if state.dispatch_on_types:
+            return self._get_selector(state, _classes_at(state.typed_positions, values))(values)
+        return state.select(values)
+
+    def _choose_cached(self, state, values):
+        key = values + tuple([value.__class__ for value in values])  # equal values of different classes may differ
+        cache = state.decision_cache
+        try:
+            function = cache[key][0]
+        except KeyError:
+            select = self._get_selector(state, _classes_at(state.typed_positions, values))
+            function = select(values)
+            func_info = select.cacheable.get(function)
+            if func_info is not None:
+                cache[key] = function, func_info  # the registration is known when removing it, see unregister()
+        except TypeError:  # unhashable arguments
+            function = self._get_selector(state, _classes_at(state.typed_positions, values))(values)
+        return function
+
+    def _get_selector(self, state, classes):
+        """Return the selector specialized for the given classes of the arguments at the state's typed positions."""
+        if not state.dispatch_on_types:
+            return state.select
+
+        if state.abc_cache_token is not None and state.abc_cache_token != _get_type_cache_token():
+            self._reset_caches(state)
+        try:
+            return state.selectors_by_classes[classes]
+        except KeyError:
+            candidates = self._specialize(state, classes)
+            if candidates:
+                select = self._make_selector(candidates)
+            else:  # no registration may match arguments of these classes, as is common for unknown ones
+                if state.fall_through_selector is None:
+                    state.fall_through_selector = self._make_selector([])
+                select = state.fall_through_selector
+            _bounded_insert(state.selectors_by_classes, classes, select)
+            return select
+
+    def call_async(self, *args, **kwargs):
+        """
+        Invoke the generic function from asyncio code: returns an asyncio Future of its result.
+
+            @generic
+            def handle(request):
+                return default_response(request)
+
+            @handle.when(lambda request: feature_flags.is_enabled('beta', request.user))  # a coroutine function
+            async def _beta(request):
+                return await beta_response(request)
+
+            response = await handle.call_async(request)
+
+        Predicates and implementations may be coroutine functions, or otherwise return awaitables,
+        which are awaited. Awaitable outcomes of predicates are awaited concurrently, and the chosen implementation
+        is still the first one, in order of registration, whose predicate is True: once it's known,
+        the predicates still awaited are cancelled. While predicates are awaited, the following ones are evaluated,
+        up to one that returns True (or raises) without being awaited.
+
+        Generic functions with predicates that are coroutine functions can't be invoked regularly,
+        as a coroutine object can't be tested for truth - doing so raises a TypeError.
+        call_async() must be called while an event loop is running (raising a RuntimeError otherwise),
+        which its futures and tasks belong to.
+        """
+        if asyncio is None:
+            raise RuntimeError('call_async() requires asyncio.')
+
+        values = self._base_func.bind(args, kwargs)
+        state = self._state
+        if state.dispatch_on_types:
+            candidates = self._get_selector(state, _classes_at(state.typed_positions, values)).candidates
+        else:
+            candidates = state.select.candidates
+
+        return _AsyncDispatch([(predicate, func_info.invoke_values) for predicate, func_info, _ in candidates],
+                              self._base_func.invoke_values, values).future
+
+    def freeze(self):
+        """
+        Reject the registration of further implementations to this generic function: when() raises a ValueError.
+        Registering to a generic function is safe while other threads call it, which never wait for it:
+        each registration builds a new snapshot of the registrations and the indexes derived from them,
+        and swaps it in. Freezing a generic function once all implementations are registered
+        also frees the table sharing equal argument names and type checks between registrations,
+        while the current snapshot, with the dispatchers generated for it so far, is kept.
+        """
+        with self._lock:
+            self._frozen = True
+            self._base_func.clear_interned()
+
+    def cache_info(self):
+        """
+        Return statistics of the cache of dispatch decisions, as a (hits, misses, maxsize, currsize) named tuple.
+
+        Dispatch decisions are cached when predicates are declared pure - either all of them,
+        with `@generic(pure=True)`, or some of them, with `when(..., pure=True)`. A pure predicate is one
+        whose outcome depends on nothing but the values of the arguments, which must be hashable to be cached.
+        The implementation chosen for arguments is cached if all predicates that were evaluated to choose it are pure.
+        The cache holds the `cache_size` (given to `generic()`, 128 by default) most recently used arguments,
+        or is unbounded if `cache_size` is None. It's cleared whenever an implementation is registered.
+        """
+        cache = self._state.decision_cache
+        return _CacheInfo(self._decision_cache_hits + (cache.hits if cache is not None else 0),
+                          self._decision_cache_misses + (cache.misses if cache is not None else 0),
+                          self._cache_size, len(cache) if cache is not None else 0)
+
+    def cache_clear(self):
+        """Clear the cache of dispatch decisions and its statistics."""
+        self._decision_cache_hits = self._decision_cache_misses = 0
+        state = self._state
+        if state.decision_cache is not None:
+            state.decision_cache = _LRUCache(self._cache_size)
+
+    def memo_info(self):
+        """
+        Return statistics of the results memoized for implementations registered with `when(..., memoize=...)`,
+        and for the default implementation if given `generic(memoize=...)`: a list of
+        (implementation, hits, misses, maxsize, currsize) named tuples, the default implementation first,
+        then in order of registration. Expired results are only counted out of `currsize` once looked up or evicted.
+        """
+        return [_MemoInfo(implementation, memo.hits, memo.misses, memo.maxsize, len(memo))
+                for implementation, _, memo in self._memos() if memo is not None]
+
+    def memo_clear(self, implementation=None):
+        """Clear the results memoized for the given implementation (or for all), and their statistics."""
+        memos = self._memos()
+        if implementation is not None:
+            key = _implementation_key(implementation)
+            memos = [(implementation, memo_key, memo) for implementation, memo_key, memo in memos if memo_key == key]
+            if not memos:
+                raise ValueError('{!r} isn\'t registered to this generic function.'.format(implementation))
+        for _, _, memo in memos:
+            if memo is not None:
+                memo.clear()
+
+    def _memos(self):
+        """Return (implementation, key, memo) triples of the default implementation and the registrations,
+        the memo being the _LRUCache of their results, or None if they aren't memoized.
+        """
+        memos = [(_implementation_of(registration), registration.key, registration.memo)
+                 for registration in self._state.registrations]
+        if self._base_memo is not None:
+            default = self._base_func._function.function  # see _Memoized
+            memos.insert(0, (default, _implementation_key(default), self._base_memo))
+        return memos
+
+    def enable_stats(self):
+        """
+        Start accounting the dispatch of calls to this generic function, as reported by stats().
+        Instrumentation is off by default, and costs nothing while it is.
+        """
+        with self._lock:
+            if self._stats is None:
+                self._stats = {registration.func_info: _StatsCounter() for registration in self._state.registrations}
+                self._default_stats = _StatsCounter()
+                self._stats_snapshot = None
+                self._rebuild_dispatch_index()
+
+    def disable_stats(self):
+        """Stop accounting the dispatch of calls. The statistics gathered so far are kept."""
+        with self._lock:
+            if self._stats is not None:
+                self._stats_snapshot = self.stats()
+                self._stats = None
+                self._rebuild_dispatch_index()
+
+    def reset_stats(self):
+        """Zero the statistics gathered."""
+        self._stats_snapshot = None
+        if self._stats is not None:
+            for counter in list(self._stats.values()) + [self._default_stats]:
+                counter.reset()
+
+    def stats(self):
+        """
+        Return the statistics gathered since instrumentation was enabled by enable_stats(),
+        as a named tuple of `registrations`, holding a named tuple per registration in order of registration,
+        and `default_calls` and `default_time`, the number of calls and the time in seconds spent
+        in the default implementation. For each registration, these are reported:
+
+        - implementation: the implementation.
+        - evaluations: the number of times its predicate was evaluated. Type checks resolved by the classes
+          of the arguments aren't evaluated per call.
+        - matches: the number of calls the implementation was chosen for.
+        - predicate_time, implementation_time: the time in seconds spent in the predicate and the implementation.
+
+        Calls invoking the generic function regularly, by imap() or by map_parallel() in a thread pool,
+        are accounted.
+        """
+        if self._stats is None:
+            if self._stats_snapshot is None:
+                raise ValueError('Statistics weren\'t gathered - enable them by enable_stats().')
+            return self._stats_snapshot
+
+        return _DispatchStats(
+            [_RegistrationStats(_implementation_of(registration), counter.evaluations, counter.matches,
+                                counter.predicate_time, counter.implementation_time)
+             for registration, counter in ((registration, self._stats[registration.func_info])
+                                           for registration in self._state.registrations)],
+            self._default_stats.matches, self._default_stats.implementation_time)
+
+    def memory_footprint(self):
+        """
+        Return the memory held by this generic function, in bytes, as a named tuple of `registrations`
+        (their number), and the memory held for each of these:
+
+        - predicates: the predicates compiled from the sources given to when().
+        - implementations: the registrations themselves, and the wrappers of their implementations.
+        - dispatch_index: the order of evaluation, and the selectors built per classes of arguments.
+        - decision_cache: the cache of dispatch decisions (see cache_info()), but not the argument values in its keys.
+        - memoized_results: the caches of results memoized for implementations (see memo_info()), but neither
+          the argument values in their keys nor the results.
+        - statistics: the counters kept by enable_stats() and for groups of registrations.
+        - total: the sum of all of the above.
+
+        Only objects allocated by the generic function are accounted: the implementations and the callables and
+        types given as predicates are not.
+        """
+        state = self._state
+        cache = state.decision_cache
+        memos = [memo for _, _, memo in self._memos() if memo is not None]
+        seen = set(id(accounted_apart) for accounted_apart in [cache] + memos)
+        predicates = _footprint([registration.predicate_info for registration in state.registrations], seen)
+        implementations = _footprint([self._base_func, state.registrations], seen)
+        dispatch_index = _footprint([state], seen)
+        # keys hold the values of arguments, which aren't accounted
+        decision_cache = 0 if cache is None else _cache_footprint(cache)
+        memoized_results = sum(_cache_footprint(memo) for memo in memos)  # nor are the results
+        statistics = _footprint([self._stats, getattr(self, '_default_stats', None), self._stats_snapshot,
+                                 self._group_counters], seen)
+        return _MemoryFootprint(len(state.registrations), predicates, implementations, dispatch_index,
+                                decision_cache, memoized_results, statistics,
+                                predicates + implementations + dispatch_index + decision_cache + memoized_results +
+                                statistics)
+
+    def analyze(self):
+        """
+        Analyse how the type checks of the registrations relate to each other, to find registrations
+        that are never chosen, and those whose order matters. Returns a named tuple of lists of
+        (implementation, earlier implementation) pairs, in the order the predicates are evaluated:
+
+        - shadowed: the earlier registration is chosen for all arguments the later one matches, which is never
+          chosen, e.g. `when(Animal)` registered before `when(Cat)`. Only the first such earlier registration
+          is listed.
+        - disjoint: no arguments can pass the type checks of both, e.g. `when(int)` and `when(str)`.
+        - overlapping: some arguments may pass the type checks of both, so the earlier one is chosen for them.
+
+        Only the type checks of the predicates are analysed: plain types, types in dicts, `type=` preconditions,
+        and lists of those. Registrations checking no types aren't listed, and other predicates are assumed to be
+        True for all arguments, except that a registration with such predicates shadows no other.
+        Types are proven disjoint if no class may derive from both, as their instances' layouts conflict
+        (e.g. built-in types like int and str) or one may not be subclassed (e.g. bool). ABCs and types referred to
+        by dotted paths that aren't imported yet are never proven disjoint from others.
+        """
+        analysed = []
+        for registration in self._state.dispatch_order:
+            alternatives, exact = _type_alternatives(registration.predicate_info)
+            if any(alternatives):
+                analysed.append((_implementation_of(registration), alternatives, exact))
+
+        shadowed, disjoint, overlapping = [], [], []
+        for position, (implementation, alternatives, _) in enumerate(analysed):
+            is_shadowed = False
+            for earlier_implementation, earlier_alternatives, earlier_exact in analysed[:position]:
+                pair = (implementation, earlier_implementation)
+                if (not is_shadowed and earlier_exact and
+                        all(any(_implies(checks, earlier_checks) for earlier_checks in earlier_alternatives)
+                            for checks in alternatives)):
+                    shadowed.append(pair)
+                    is_shadowed = True
+                elif all(_disjoint_checks(checks, earlier_checks)
+                         for checks in alternatives for earlier_checks in earlier_alternatives):
+                    disjoint.append(pair)
+                else:
+                    overlapping.append(pair)
+        return _Analysis(shadowed, disjoint, overlapping)
+
+    def map_batch(self, **columns):
+        """
+        Invoke the generic function over a batch of calls, whose arguments are given as columns:
+        sequences (e.g. lists, NumPy arrays or pandas Series) of the same length, passed by argument name.
+        Returns a list of the results of all calls, in the order of the rows.
+
+            @generic
+            def price(quantity, unit_price):
+                return quantity * unit_price
+
+            @price.when(lambda quantity: quantity > 100, vectorized=True)
+            def _bulk_price(quantity, unit_price):
+                return quantity * unit_price * 0.9
+
+            price.map_batch(quantity=numpy.array([1, 200]), unit_price=numpy.array([10., 10.])) --> [10., 1800.]
+
+        Each predicate is evaluated once per batch, over the rows not yet matched by an earlier predicate,
+        and the rows are partitioned by the first registration they match, as calls would be.
+        Predicates and implementations registered with `vectorized=True` are invoked once per partition,
+        with the columns of its rows (taken with the columns' `take()` method, if they have one),
+        and must return a sequence of booleans or results respectively, one per row.
+        All others, including the default implementation, are invoked once per row.
+        As always, arguments are injected into predicates and implementations by their name.
+        Arguments with defaults may be left out, which then take them in every row.
+        """
+        given = set(columns)
+        columns = self._base_func.bind((), columns)  # raises a TypeError naming arguments left out without defaults
+        lengths = set(len(column) for arg_name, column in zip(self._base_func.args, columns) if arg_name in given)
+        if len(lengths) > 1:
+            raise ValueError('All columns must have the same length.')
+        length = lengths.pop() if lengths else 0
+        columns = tuple(column if arg_name in given else [column] * length
+                        for arg_name, column in zip(self._base_func.args, columns))
+
+        rows_values = []
+
+        def get_row_values(row):
+            if not rows_values:
+                rows_values.extend(zip(*columns))
+            return rows_values[row]
+
+        partitions = []
+        unmatched = list(range(length))
+        state = self._state
+        dispatch_order = state.dispatch_order
+        position = 0
+        while position < len(dispatch_order) and unmatched:
+            registration = dispatch_order[position]
+            if registration.vectorized:
+                outcomes = registration.predicate_info.test(_take_rows(columns, unmatched, length))
+                outcomes = list(outcomes)
+                if len(outcomes) != len(unmatched):
+                    raise ValueError('A vectorized predicate must return one outcome per row.')
+                matched = [row for row, outcome in zip(unmatched, outcomes) if outcome]
+                if matched:
+                    partitions.append((registration.func_info.invoke_values, True, matched))
+                    unmatched = [row for row, outcome in zip(unmatched, outcomes) if not outcome]
+                position += 1
+                continue
+
+            # the following registrations that aren't vectorized choose rows like calls would
+            end = position + 1
+            while end < len(dispatch_order) and not dispatch_order[end].vectorized:
+                end += 1
+            if position == 0 and end == len(dispatch_order):
+                choose = self._get_chooser(state)  # which also chooses the default
+            else:
+                choose = self._get_batch_chooser(state, position, end)
+            rows_by_function = collections.OrderedDict()
+            for row in unmatched:
+                rows_by_function.setdefault(choose(*get_row_values(row)), []).append(row)
+            unmatched = rows_by_function.pop(None, [])
+            partitions.extend((function, False, rows) for function, rows in rows_by_function.items())
+            position = end
+
+        if unmatched:
+            partitions.append((self._base_func.invoke_values, False, unmatched))
+
+        results = [None] * length
+        for function, vectorized, rows in partitions:
+            if vectorized:
+                partition_results = list(function(_take_rows(columns, rows, length)))
+                if len(partition_results) != len(rows):
+                    raise ValueError('A vectorized implementation must return one result per row.')
+                for row, result in zip(rows, partition_results):
+                    results[row] = result
+            else:
+                for row in rows:
+                    results[row] = function(get_row_values(row))
+
+        return results
+
+    def imap(self, iterable, chunk_size=256, ordered=True):
+        """
+        Lazily invoke the generic function on each tuple of positional arguments from the iterable,
+        yielding the results. Like itertools.imap(func, *zip(*iterable)), but dispatching by chunks:
+        at most `chunk_size` tuples are taken from the iterable at once, so memory use doesn't depend
+        on its length. The predicates are evaluated for the whole chunk before its implementations are invoked.
+
+        :param ordered: If False, the results of each chunk are yielded grouped by the implementation
+                        that produced them, rather than in the order of the arguments.
+        """
+        n_args = len(self._base_func.args) if self._base_func.parameters.only_positional else None
+
+        def bind(row):
+            if len(row) == n_args:
+                return tuple(row)
+            return self._base_func.bind(tuple(row), {})
+
+        return self._imap(iterable, bind, chunk_size, ordered)
+
+    def imap_kwargs(self, iterable, chunk_size=256, ordered=True):
+        """Like imap(), for an iterable of dicts mapping argument names to values."""
+        arg_names = self._base_func.args
+        fast_path = self._base_func.parameters.only_positional
+        if len(arg_names) == 1:
+            arg_name, = arg_names
+            get_values = lambda row: (row[arg_name],)
+        else:
+            get_values = operator.itemgetter(*arg_names) if arg_names else lambda row: ()
+
+        def bind(row):
+            if fast_path and len(row) == len(arg_names):
+                try:
+                    return get_values(row)
+                except KeyError:
+                    pass
+            return self._base_func.bind((), row)  # raises the appropriate error
+
+        return self._imap(iterable, bind, chunk_size, ordered)
 
-    def when(self, predicate_source, type=None):
+    def map_parallel(self, iterable, executor, chunk_size=256, max_pending=8):
+        """
+        Invoke the generic function on each tuple of positional arguments from the iterable in an executor
+        from `concurrent.futures`, either a thread pool or a process pool, yielding the results in order.
+
+        The tuples are sent to the executor in chunks of `chunk_size`, and at most `max_pending` chunks are
+        submitted ahead of the results yielded, so the iterable is consumed lazily.
+        A process pool requires the generic function to be picklable, which it is if it can be found
+        by its name in its module, like a regular function: it's pickled by reference, so workers use the one
+        they imported, with all of its registrations, instead of building it per task.
+        """
+        if chunk_size < 1 or max_pending < 1:
+            raise ValueError('chunk_size and max_pending must be positive.')
+
+        def results():
+            iterator = iter(iterable)
+            pending = collections.deque()
+            while True:
+                while len(pending) < max_pending:
+                    chunk = list(itertools.islice(iterator, chunk_size))
+                    if not chunk:
+                        break
+                    pending.append(executor.submit(_invoke_chunk, self, chunk))
+                if not pending:
+                    return
+                for result in pending.popleft().result():
+                    yield result
+
+        return results()
+
+    def __reduce__(self):
+        # pickle by reference, like functions
+        name = getattr(self, '__qualname__', None) or getattr(self, '__name__', None)
+        if name is None:
+            raise pickle.PicklingError('Can\'t pickle {!r}: it has no name to be found by.'.format(self))
+        return name
+
+    def _imap(self, iterable, bind, chunk_size, ordered):
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be positive.')
+
+        def results():
+            iterator = iter(iterable)
+            while True:
+                choose = self._get_chooser(self._state)  # per chunk, so it follows registrations meanwhile
+                chunk = []
+                for row in itertools.islice(iterator, chunk_size):
+                    values = bind(row)
+                    chunk.append((choose(*values), values))
+                if not chunk:
+                    return
+
+                if ordered:
+                    for function, values in chunk:
+                        yield function(values)
+                else:
+                    calls_by_function = collections.OrderedDict()
+                    for function, values in chunk:
+                        calls_by_function.setdefault(function, []).append(values)
+                    for function, calls in calls_by_function.items():
+                        for values in calls:
+                            yield function(values)
+
+        return results()
+
+    def _specialize(self, state, classes):
+        """Specialize the registered predicates for the given classes of the arguments at the state's typed positions.
+        Returns the (predicate, implementation, pure) triples that may still match arguments of these classes,
+        in order. The predicate is None for the last triple if the classes alone decide that its implementation
+        is chosen.
+        """
+        classes_by_position = [None] * len(self._base_func.args)  # no predicate checks the types of the others
+        for position, cls in zip(state.typed_positions, classes):
+            classes_by_position[position] = cls
+
+        candidates = []
+        for registration in state.dispatch_order:
+            predicate = registration.predicate_info.specialize(classes_by_position)
+            if predicate is True:
+                candidates.append((None, registration.func_info, True))
+                break
+            if predicate is not False:
+                candidates.append((predicate, registration.func_info, registration.pure or predicate.pure))
+        return candidates
+
+    def _make_selector(self, candidates):
+        """Make a callable choosing among the given (predicate, implementation, pure) triples,
+        given the values of the arguments. It returns the chosen implementation, as a callable taking the values.
+
+        The returned callable also has a `candidates` attribute, holding the given triples,
+        and a `cacheable` attribute: the implementations whose choice only depends on pure predicates,
+        mapped to the _FunctionInfo they invoke.
+        """
+        default = self._base_func.invoke_values
+        implementations = [func_info.invoke_values for _, func_info, _ in candidates]
+        test_wrappers = []
+
+        # observing and instrumentation only replace the callables used here, so dispatch isn't slowed down without
+        if self._group_counters:
+            group_counters = [self._group_counters.get(func_info) for _, func_info, _ in candidates]
+            implementations = [implementation if counter is None else self._count_group_match(implementation, counter)
+                               for implementation, counter in zip(implementations, group_counters)]
+            test_wrappers.append(lambda test, position: test if group_counters[position] is None
+                                 else _sampled_predicate(test, group_counters[position]))
+
+        stats = self._stats  # selectors are made by calls too, so this may change meanwhile
+        if stats is not None:
+            counters = [stats.get(func_info) or _StatsCounter() for _, func_info, _ in candidates]
+            default = _timed_implementation(default, self._default_stats)
+            implementations = [_timed_implementation(implementation, counter)
+                               for implementation, counter in zip(implementations, counters)]
+            test_wrappers.append(lambda test, position: _timed_predicate(test, counters[position]))
+
+        tests = [None if predicate is None else predicate.test for predicate, _, _ in candidates]
+        for wrap_test in test_wrappers:
+            tests = [None if test is None else wrap_test(test, position) for position, test in enumerate(tests)]
+        tests_and_implementations = tuple(zip(tests, implementations))
+
+        def select(values):
+            for predicate, function in tests_and_implementations:
+                if predicate is None or predicate(values):
+                    return function
+            return default
+
+        select.candidates = candidates
+
+        # an implementation may be cached if all predicates evaluated before choosing it are pure
+        select.cacheable = {}
+        for (predicate, func_info, pure), implementation in zip(candidates, implementations):
+            if not pure:
+                break
+            select.cacheable[implementation] = func_info
+        else:
+            select.cacheable[default] = self._base_func
+
+        return select
+
+    def _rebuild_dispatch_index(self, registrations=None, invalidate_cache=True):
+        """Swap in a new state, built from the given registrations (by default, the current ones),
+        except those whose weakly held objects got collected. Must be called holding self._lock.
+        """
+        if registrations is None:
+            registrations = self._state.registrations
+        registrations = [registration for registration in registrations if _is_alive(registration)]
+        typed_positions = set()
+        for registration in registrations:
+            typed_positions.update(_type_checked_positions(registration.predicate_info))
+        self._swap_in_state(registrations, typed_positions,
+                            any(_checks_abcs(registration.predicate_info) for registration in registrations),
+                            any(registration.pure for registration in registrations), invalidate_cache)
+
+    def _append_registration(self, registration):
+        """Swap in a new state, with the given registration following the current ones. What the new state holds
+        is derived from the current one's, so registering many implementations takes linear time.
+        Must be called holding self._lock.
+        """
+        previous = self._state
+        predicate = registration.predicate_info
+        self._swap_in_state(previous.followed_by(registration),
+                            set(previous.typed_positions).union(_type_checked_positions(predicate)),
+                            previous.checks_abcs or _checks_abcs(predicate),
+                            previous.decision_cache is not None or registration.pure, invalidate_cache=True)
+
+    def _swap_in_state(self, registrations, typed_positions, checks_abcs, any_pure, invalidate_cache):
+        self._rebuilding = True
+        try:
+            previous = self._state
+            # like functools.singledispatch, drop the index when ABCs get new virtual subclasses registered
+            # (or when referenced types get resolved, which may be ABCs)
+            abc_cache_token = _get_type_cache_token() if checks_abcs else None
+
+            if not invalidate_cache:
+                decision_cache = previous.decision_cache
+            else:
+                if previous is not None:
+                    self._retire_decision_cache(previous.decision_cache)
+                decision_cache = _LRUCache(self._cache_size) if self._pure or any_pure else None
+
+            state = _DispatchState(self, registrations, tuple(sorted(typed_positions)), checks_abcs, abc_cache_token,
+                                   decision_cache)
+            state.call = self._make_lazy_dispatcher(state)
+            self._state = state
+        finally:
+            self._rebuilding = False
+        if self._collected:
+            self._remove_collected()
+
+    def _make_lazy_dispatcher(self, state):
+        # generating the dispatcher upon every registration would make registering many implementations quadratic
+        def generate_and_dispatch(*args, **kwargs):
+            state.call = self._generate_dispatcher(state)
+            return state.call(*args, **kwargs)
+        return generate_and_dispatch
+
+    def _get_chooser(self, state):
+        """Return the function choosing the implementation for the values of the arguments, by the given state,
+        which takes them as positional arguments and returns the implementation as a callable taking the values.
+        It's generated like the dispatcher (see _generate_dispatcher), so choosing rows by imap() or map_batch()
+        evaluates predicates just like calls do.
+        """
+        choose = state.choose
+        if choose is None:
+            choose = state.choose = self._generate_dispatcher(state, choose=True)
+        return choose
+
+    def _generate_dispatcher(self, state, choose=False):
+        """Generate the function calls to the generic function are dispatched by, which takes the same arguments
+        (or, if `choose` is True, the one returned by _get_chooser).
+
+        The predicates and implementations are invoked by the generated code directly, with the arguments
+        each of them takes, and type checks are inlined. Arguments of a generic function with type checks are
+        dispatched by a function generated per classes of the arguments, for which type checks are resolved
+        ahead of time (only the classes of the arguments whose types are checked are told apart).
+        Cached, instrumented or adaptively ordered dispatch is left to the selectors.
+        """
+        code = self._choosing_code() if choose else _CodeBuilder(self._base_func.parameters)
+
+        if self._stats is not None or self._group_counters or state.decision_cache is not None:
+            if choose:
+                return lambda *values: self._choose(state, values)
+            return code.build(['return {}({}, {})'.format(code.ref(self._dispatch), code.ref(state), code.values)])
+
+        if not state.dispatch_on_types:
+            return self._generate_selection(code, [(registration.predicate_info, registration.func_info)
+                                                   for registration in state.dispatch_order], choose)
+
+        lines = []
+        if state.abc_cache_token is not None:
+            lines.append('if {state}.abc_cache_token != {get_cache_token}():\n'
+                         '    {reset_caches}({state})'
+                         .format(state=code.ref(state), get_cache_token=code.ref(_get_type_cache_token),
+                                 reset_caches=code.ref(self._reset_caches)))
+            dispatchers = '{}.dispatchers_by_classes'.format(code.ref(state))
+        else:
+            dispatchers = code.ref(state.dispatchers_by_classes)  # never replaced without ABCs
+
+        classes = code.local('classes')
+        dispatcher = code.local('dispatcher')
+        lines.append('{classes} = ({arg_classes},)\n'
+                     'try:\n'
+                     '    {dispatcher} = {dispatchers}[{classes}]\n'
+                     'except KeyError:\n'
+                     '    {dispatcher} = {get_dispatcher}({state}, {classes})'
+                     .format(classes=classes, dispatcher=dispatcher, dispatchers=dispatchers,
+                             arg_classes=', '.join('{}.__class__'.format(code.arg_names[position])
+                                                   for position in state.typed_positions),
+                             get_dispatcher=code.ref(self._get_dispatcher), state=code.ref(state)))
+        if choose:
+            # the dispatchers of the classes are shared, and choosers are generated for them as needed
+            chooser = code.local('choose')
+            lines.append('{chooser} = {dispatcher}.choose\n'
+                         'if {chooser} is None:\n'
+                         '    {chooser} = {generate_chooser}({dispatcher})\n'
+                         'return {chooser}({args})'
+                         .format(chooser=chooser, dispatcher=dispatcher, args=', '.join(code.arg_names),
+                                 generate_chooser=code.ref(self._generate_chooser)))
+        else:
+            lines.append('return {}({})'.format(dispatcher, code.arguments(self._base_func.parameters)))
+        return code.build(lines)
+
+    def _get_batch_chooser(self, state, start, end):
+        """Return a chooser (see _get_chooser) among the registrations from `start` to `end` in the state's order
+        of evaluation, returning None if none of them matches.
+        """
+        choosers = state.batch_choosers
+        if choosers is None:
+            choosers = state.batch_choosers = {}
+        choose = choosers.get(start)
+        if choose is None:
+            choose = choosers[start] = self._generate_selection(
+                self._choosing_code(), [(registration.predicate_info, registration.func_info)
+                                        for registration in state.dispatch_order[start:end]], True, False)
+        return choose
+
+    def _generate_chooser(self, dispatcher):
+        """Generate the chooser (see _get_chooser) for the arguments of the classes a dispatcher was generated for."""
+        dispatcher.choose = self._generate_selection(
+            self._choosing_code(), [(predicate, func_info) for predicate, func_info, _ in dispatcher.candidates], True)
+        return dispatcher.choose
+
+    def _choosing_code(self):
+        # choosers take the values of all arguments positionally, with no defaults as they're always given
+        return _CodeBuilder(_Parameters(self._base_func.args))
+
+    def _get_dispatcher(self, state, classes):
+        """Return the function generated to dispatch arguments of the given classes, generating it if needed.
+        Arguments of all classes no registration may match share the same function, invoking the default.
+        """
+        candidates = self._specialize(state, classes)
+        if candidates:
+            dispatcher = self._generate_selection(_CodeBuilder(self._base_func.parameters),
+                                                  [(predicate, func_info) for predicate, func_info, _ in candidates])
+            dispatcher.candidates = candidates
+            dispatcher.choose = None  # see _generate_chooser
+        else:
+            if state.fall_through_dispatcher is None:
+                state.fall_through_dispatcher = self._generate_selection(_CodeBuilder(self._base_func.parameters), [])
+                state.fall_through_dispatcher.candidates = []
+                state.fall_through_dispatcher.choose = None
+            dispatcher = state.fall_through_dispatcher
+        _bounded_insert(state.dispatchers_by_classes, classes, dispatcher)
+        return dispatcher
+
+    def _generate_selection(self, code, candidates, choose=False, choose_default=True):
+        """Generate a function invoking the first implementation whose predicate is True,
+        given (predicate, implementation) pairs, a None predicate meaning the implementation is chosen unconditionally.
+        If `choose` is True, the function returns the implementation instead, as a callable taking the values
+        of the arguments - or, if none matches and `choose_default` is False, None rather than the default.
+
+        Parts of the predicates' AND relations shared by several of them (other than type checks, which are cheaper
+        to repeat) are evaluated at most once per call: their outcome is kept in a local variable.
+        """
+        registrations_by_part = collections.defaultdict(set)
+        for position, (predicate, _) in enumerate(candidates):
+            for part in _and_parts(predicate):
+                if not isinstance(part, _TypeCheck):
+                    registrations_by_part[part.key].add(position)
+        shared = {}
+        lines = []
+        for predicate, _ in candidates:
+            for part in _and_parts(predicate):
+                if len(registrations_by_part.get(part.key, ())) > 1 and part.key not in shared:
+                    shared[part.key] = code.local('shared{}'.format(len(shared)))
+                    lines.append('{} = None'.format(shared[part.key]))
+
+        def outcome(func_info):
+            return code.ref(func_info.invoke_values) if choose else code.call(func_info)
+
+        position = 0
+        while position < len(candidates):
+            predicate, func_info = candidates[position]
+            if predicate is None:
+                lines.append('return {}'.format(outcome(func_info)))
+                break
+
+            run_end = position + 1  # of consecutive value checks of the same argument, which are indexed
+            while (isinstance(predicate, _ValueCheck) and run_end < len(candidates)
+                   and isinstance(candidates[run_end][0], _ValueCheck)
+                   and candidates[run_end][0].index == predicate.index):
+                run_end += 1
+            if run_end - position >= _ValueIndex.min_conditions:
+                run = candidates[position:run_end]
+                matched = code.local('matched')
+                index = _ValueIndex([check.condition for check, _ in run])
+                lines.append('{matched} = {index}({arg_name})\n'
+                             'if {matched} is not None:\n'
+                             '    return {implementations}[{matched}]{call}'
+                             .format(matched=matched, index=code.ref(index), arg_name=code.arg_names[predicate.index],
+                                     call='' if choose else '({})'.format(code.values),
+                                     implementations=code.ref(tuple(func_info.invoke_values for _, func_info in run))))
+                position = run_end
+                continue
+            position += 1
+
+            indent = ''
+            conditions = []
+            for part in _and_parts(predicate):
+                name = shared.get(part.key)
+                if name is None:
+                    conditions.append(part.source(code))
+                    continue
+                if conditions:
+                    lines.append('{}if {}:'.format(indent, ' and '.join(conditions)))
+                    indent += '    '
+                lines.append('{indent}if {name} is None:\n'
+                             '{indent}    {name} = {bool}({source})'
+                             .format(indent=indent, name=name, bool=code.ref(bool), source=part.source(code)))
+                conditions = [name]
+            lines.append('{indent}if {conditions}:\n'
+                         '{indent}    return {outcome}'
+                         .format(indent=indent, conditions=' and '.join(conditions), outcome=outcome(func_info)))
+        else:
+            lines.append('return {}'.format(outcome(self._base_func) if choose_default or not choose else 'None'))
+        return code.build(lines)
+
+    def _reset_caches(self, state):
+        """Drop what a state derived from the classes of arguments, as ABCs got new virtual subclasses registered,
+        or referenced types got resolved.
+        """
+        state.selectors_by_classes = {}
+        state.dispatchers_by_classes = {}
+        if state.decision_cache is not None:
+            self._retire_decision_cache(state.decision_cache)
+            state.decision_cache = _LRUCache(self._cache_size)
+        state.abc_cache_token = _get_type_cache_token()  # last, so other calls don't skip resetting before it's done
+
+    def _retire_decision_cache(self, cache):
+        if cache is not None:
+            self._decision_cache_hits += cache.hits
+            self._decision_cache_misses += cache.misses
+
+    def _order_registrations(self, registrations):
+        """Return the given registrations in the order their predicates are evaluated, as a tuple:
+        the order of registration, except that the registrations of each group are evaluated together,
+        at the position of the group's first registration, in order of their score (see _GroupCounter).
+        """
+        order = []
+        groups = {}
+        for registration in registrations:
+            if registration.group is None:
+                order.append([registration])
+            elif registration.group in groups:
+                groups[registration.group].append(registration)
+            else:
+                groups[registration.group] = [registration]
+                order.append(groups[registration.group])
+
+        for registrations in groups.values():
+            # registrations removed since the state was made, which may still be ordered by calls, aren't counted
+            counters = [self._group_counters.get(registration.func_info) or _GroupCounter()
+                        for registration in registrations]
+            known_costs = [counter.cost for counter in counters if counter.cost is not None]
+            unknown_cost = sum(known_costs) / len(known_costs) if known_costs else 1.0
+            # sorting is stable, so the order of registration is kept until there's something to go by
+            scores = dict((id(registration), -counter.score(unknown_cost))
+                          for registration, counter in zip(registrations, counters))
+            registrations.sort(key=lambda registration: scores[id(registration)])
+
+        return tuple(registration for registrations in order for registration in registrations)
+
+    def _count_group_match(self, function, counter):
+        def counted_function(values):
+            counter.matches += 1
+            self._matches_until_reorder -= 1
+            if self._matches_until_reorder <= 0:
+                self._reorder_groups()
+            return function(values)
+        return counted_function
+
+    def _reorder_groups(self):
+        self._matches_until_reorder = self._reorder_interval
+        if not self._lock.acquire(False):
+            return  # calls don't wait for registration, which reorders anyway
+        try:
+            state = self._state
+            if self._order_registrations(state.registrations) != state.dispatch_order:
+                self._rebuild_dispatch_index(invalidate_cache=False)  # the choice of implementations doesn't change
+            counters = list(self._group_counters.values())  # which registration changes, holding the lock
+        finally:
+            self._lock.release()
+        for counter in counters:
+            counter.decay()
+
+    def when(self, predicate_source, type=None, pure=False, vectorized=False, group=None, weak=False,
+             cost=None, selectivity=None, memoize=None, memoize_ttl=None):
         """
         A decorator used to register an implementation to a generic function.
         The decorator takes a predicate, to which the implementation will be mapped.
@@ -94,143 +1049,903 @@ class generic(object):
         predicate returned True will be invoked.
 
         :param predicate_source: The predicate may be any one of the following options:
-                            A type (meaning an `isinstance()` check), a callable that returns a boolean,
+                            A type (meaning an `isinstance()` check), or the dotted path of one
+                            (e.g. 'numpy.ndarray', see below), a callable that returns a boolean,
+                            a condition on values made by equals(), one_of() or in_range(),
                             or a list of predicates (with AND relations between them):
+        :param pure: Declare that the outcome of the predicate depends on nothing but the values of the arguments,
+                     so dispatch decisions relying on it may be cached (see cache_info()).
+        :param vectorized: Declare that the predicate and the implementation may also take whole columns
+                           of arguments, as done by map_batch(). The predicate must then be a callable.
+        :param group: Declare that the predicate is mutually exclusive with the predicates of all other registrations
+                      of the same group (any hashable name): no arguments make more than one of them True.
+                      The predicates of a group are evaluated together, where the group's first registration is,
+                      and are periodically reordered so those that match most often and cost least are evaluated
+                      first - every `reorder_interval` (given to `generic()`, 1000 by default) calls matching any
+                      group. If the predicates of a group do overlap, which of their implementations is chosen
+                      is unspecified.
+        :param weak: Hold the implementation weakly - or the instance of a bound method, which the predicate
+                     may also be - and unregister it once collected, so registering e.g. the methods of a plugin
+                     doesn't keep it alive.
+        :param cost: Hint how costly the predicate is to evaluate, relative to a type check (see hint()),
+                     so the type check given as `type` is evaluated first only if it's cheaper.
+        :param selectivity: Hint which fraction of calls the predicate is True for (see hint()).
+        :param memoize: Memoize the results of the implementation, which must depend on nothing but the values
+                        of its arguments: True to keep the 128 most recently used, or their number. Results are keyed
+                        by the (hashable) arguments injected into the implementation, so calls differing by others
+                        share them. Defaults to the `memoize` given to generic(), which doesn't memoize by default.
+                        See memo_info() and memo_clear().
+        :param memoize_ttl: How many seconds memoized results are kept (by default, the `memoize_ttl` given to
+                            generic(), or forever).
+
+        Types may be referred to by their dotted path wherever a type is accepted, so registering them doesn't import
+        their module: the path is only resolved once the module is imported by something else, as arguments
+        can't be instances of a type whose module was never imported.
         """
+        if vectorized and (type is not None or not isinstance(predicate_source, Callable)
+                           or isinstance(predicate_source, (_Predicate, _builtin_type))):
+            raise TypeError('A vectorized predicate must be a callable.')
+        self._check_not_frozen()
+
+        predicate_refs = ()
+        if weak and _is_bound_method(predicate_source):
+            function, parameters, ref = _weakly_held(predicate_source, self._on_collected)
+            predicate_source = _PartialFunction(function, self._base_func, parameters=parameters)
+            predicate_refs = (ref,)
+        if cost is not None or selectivity is not None:
+            predicate_source = hint(predicate_source, cost, selectivity)
         predicate = self.make_predicate(predicate_source, prepend_typecheck=type)
 
+        if memoize is None:
+            memoize = self._memoize
+        if memoize_ttl is None:
+            memoize_ttl = self._memoize_ttl
+        _check_memoize_options(memoize, memoize_ttl)
+
         def dec(func):
-            impl_info = _PartialFunction(func, self._base_func)
+            function, parameters, weak_refs, memo = func, None, predicate_refs, None
+            if weak:
+                function, parameters, ref = _weakly_held(func, self._on_collected)
+                weak_refs += (ref,)
+            if memoize:
+                memo = _make_memo(func, memoize, memoize_ttl)
+                function, parameters = _Memoized(function, memo), parameters or _Parameters.of(func)
+            impl_info = _PartialFunction(function, self._base_func, parameters=parameters)
 
             if not self._all_params_valid(predicate):
                 raise ValueError('Argument specified in predicate doesn\'t exist in base function.')
             if not self._all_params_valid(impl_info):
                 raise ValueError('Argument specified in implementation doesn\'t exist in base function.')
 
-            self._predicates_and_funcs.append(_PredicateFunctionMappping(predicate, impl_info))
+            registration = _PredicateFunctionMappping(predicate, impl_info, pure or self._pure, vectorized, group,
+                                                      _implementation_key(func), weak_refs, memo)
+            with self._lock:
+                self._check_not_frozen()
+                if group is not None:
+                    self._group_counters[impl_info] = _GroupCounter()
+                if self._stats is not None:
+                    self._stats[impl_info] = _StatsCounter()
+                self._append_registration(registration)
             return func
 
         return dec
 
+    def unregister(self, implementation):
+        """
+        Remove the registrations of an implementation (as given to the decorator when() returns),
+        as if it was never registered. Raises a ValueError if it isn't registered.
+
+        What calls derived from the registrations is kept where none of the removed ones took part:
+        dispatchers specialized for classes of arguments they couldn't match, and cached decisions
+        that chose other implementations.
+        """
+        key = _implementation_key(implementation)
+        with self._lock:
+            self._check_not_frozen()
+            removed = [registration for registration in self._state.registrations if registration.key == key]
+            if not removed:
+                raise ValueError('{!r} isn\'t registered to this generic function.'.format(implementation))
+            self._remove_registrations(removed)
+
+    @contextlib.contextmanager
+    def registered(self, predicate_source, implementation, **options):
+        """
+        Register an implementation, taking the same options as when(), for the duration of a `with` block:
+
+            with handle.registered(lambda request: request.path == '/debug', debug_handler):
+                ...
+        """
+        key = _implementation_key(implementation)
+        registered_before = set(id(registration) for registration in self._state.registrations)
+        self.when(predicate_source, **options)(implementation)
+        added = set(id(registration) for registration in self._state.registrations
+                    if registration.key == key and id(registration) not in registered_before)
+        try:
+            yield implementation
+        finally:
+            with self._lock:
+                self._remove_registrations([registration for registration in self._state.registrations
+                                            if id(registration) in added])
+
+    def _remove_registrations(self, removed):
+        """Swap in a state without the given registrations, keeping what the previous state derived where none
+        of them took part: removing registrations that weren't candidates for arguments of some classes doesn't
+        change how those are dispatched, nor does removing registrations that weren't chosen for some values.
+        Must be called holding self._lock.
+        """
+        previous = self._state
+        removed_ids = set(id(registration) for registration in removed)
+        removed_infos = set(registration.func_info for registration in removed)
+        for func_info in removed_infos:
+            self._group_counters.pop(func_info, None)
+            if self._stats is not None:
+                self._stats.pop(func_info, None)
+        self._rebuild_dispatch_index(tuple(registration for registration in previous.registrations
+                                           if id(registration) not in removed_ids), invalidate_cache=False)
+        state = self._state
+        if state.decision_cache is not None:  # which may hold decisions made by the selectors of earlier states too
+            state.decision_cache.discard(lambda decision: decision[1] in removed_infos)
+
+        if (state.typed_positions != previous.typed_positions or
+                previous.abc_cache_token not in (None, _get_type_cache_token())):
+            return  # the classes of arguments are told apart differently, or what was derived from them is stale
+        for by_classes, previous_by_classes in [(state.selectors_by_classes, previous.selectors_by_classes),
+                                                (state.dispatchers_by_classes, previous.dispatchers_by_classes)]:
+            for classes, select in list(previous_by_classes.items()):
+                if not any(func_info in removed_infos for _, func_info, _ in select.candidates):
+                    by_classes[classes] = select
+        state.fall_through_selector = previous.fall_through_selector
+        state.fall_through_dispatcher = previous.fall_through_dispatcher
+
+    def _on_collected(self, ref):
+        with self._lock:
+            if self._rebuilding:
+                self._collected = True  # the state being built leaves the registration out, or is followed by one
+            else:
+                self._remove_collected()
+
+    def _remove_collected(self):
+        self._collected = False
+        collected = [registration for registration in self._state.registrations if not _is_alive(registration)]
+        if collected:
+            self._remove_registrations(collected)
+
+    def _check_not_frozen(self):
+        if self._frozen:
+            raise ValueError('Implementations can\'t be registered to, nor unregistered from, '
+                             'a frozen generic function.')
+
     def make_predicate(self, predicate_source, prepend_typecheck=None):
-        if isinstance(predicate_source, collections.Callable):
-            predicate = self._make_predicate_from_callable(predicate_source)
-        elif isinstance(predicate_source, dict):
-            predicate = self._make_predicate_from_dict(predicate_source)
-        elif isinstance(predicate_source, collections.Iterable):  # this check must appear after the dict check
-            predicate = self._make_predicate_from_iterable(predicate_source)
-        else:
-            raise TypeError('Input to when() is not a callable, a dict or an iterable of callables.')
+        predicate = self._make_predicate(predicate_source, self._base_func.args, self._plain_arg_names)
 
         if prepend_typecheck is None:
             return predicate
         else:
             return self._prepend_typecheck_to_predicate(prepend_typecheck, predicate)
 
-    def _make_predicate_from_callable(self, predicate_source):
-        if isinstance(predicate_source, _PartialFunction):
+    @property
+    def _plain_arg_names(self):
+        """The arguments checked by plain types and value conditions given to when(): all but *args and **kwargs."""
+        return self._base_func.parameters.positional + self._base_func.parameters.keyword_only
+
+    def _make_predicate(self, predicate_source, arg_names, plain_arg_names=None):
+        """Compile a predicate source over the given arguments of the base function.
+        Plain types and value conditions check all of these arguments (or the given plain ones),
+        and callables may only take some of them.
+        """
+        if plain_arg_names is None:
+            plain_arg_names = arg_names
+
+        if isinstance(predicate_source, _Hint):
+            predicate = self._make_predicate(predicate_source.predicate_source, arg_names, plain_arg_names)
+            if isinstance(predicate_source.predicate_source, _Predicate):
+                predicate = copy.copy(predicate)  # ready predicates are taken as is, so don't hint them
+            predicate.hint(predicate_source.cost, predicate_source.selectivity)
+            return predicate
+        elif isinstance(predicate_source, _ValueCondition):
+            checks = [_ValueCheck(self._base_func, self._base_func.args.index(arg_name), predicate_source)
+                      for arg_name in plain_arg_names]
+            return checks[0] if len(checks) == 1 else _AllOf(self._base_func, checks)
+        elif isinstance(predicate_source, _string_types):
+            return self._make_type_predicate(predicate_source, arg_names, plain_arg_names)
+        elif isinstance(predicate_source, Callable):
+            return self._make_predicate_from_callable(predicate_source, arg_names, plain_arg_names)
+        elif isinstance(predicate_source, dict):
+            return self._make_predicate_from_dict(predicate_source, arg_names)
+        elif isinstance(predicate_source, Iterable):  # this check must appear after the dict check
+            return self._make_predicate_from_iterable(predicate_source, arg_names, plain_arg_names=plain_arg_names)
+        else:
+            raise TypeError('Input to when() is not a callable, a dict or an iterable of callables.')
+
+    def _make_predicate_from_callable(self, predicate_source, arg_names, plain_arg_names=None):
+        if isinstance(predicate_source, _Predicate):
             return predicate_source  # allow passing already ready predicates, but return them as is
 
+        elif isinstance(predicate_source, _PartialFunction):
+            partial_function = predicate_source
+
         elif inspect.isfunction(predicate_source) or inspect.ismethod(predicate_source):
-            return _PartialFunction(predicate_source, self._base_func)
+            partial_function = _PartialFunction(predicate_source, self._base_func, leftover_args=arg_names)
 
         elif isinstance(predicate_source, type):
-            return self._make_type_predicate(predicate_source)
+            return self._make_type_predicate(predicate_source, arg_names, plain_arg_names)
 
         else:  # different callable object
-            return _PartialFunction(predicate_source.__call__, self._base_func)
+            partial_function = _PartialFunction(predicate_source.__call__, self._base_func, leftover_args=arg_names)
 
-    def _make_predicate_from_dict(self, predicate_dict):
-        def predicate(*args, **kwargs):
-            for arg_name, arg_predicate_source in predicate_dict.iteritems():
-                arg_value = self._base_func.get_arg_value(arg_name, args, kwargs)
+        if any(arg_name not in arg_names for arg_name in partial_function.args):
+            raise ValueError('Argument specified in predicate doesn\'t exist in base function.')
+        return _CallablePredicate(self._base_func, partial_function)
 
-                gen = generic(_FunctionInfo(args=[arg_name]))
-                arg_predicate = gen.make_predicate(arg_predicate_source)
+    def _make_predicate_from_dict(self, predicate_dict, arg_names):
+        expected_types = []
+        arg_predicates = []
+        for arg_name, arg_predicate_source in predicate_dict.items():
+            if arg_name not in arg_names:
+                raise ValueError('Argument specified in predicate doesn\'t exist in base function.')
 
-                if not arg_predicate(arg_value):
-                    return False
-            return True
+            if isinstance(arg_predicate_source, (type, _string_types)):
+                expected_types.append((self._base_func.args.index(arg_name), arg_predicate_source))
+            else:
+                # the predicate of each argument only sees that argument
+                arg_predicates.append(self._make_predicate(arg_predicate_source, (arg_name,)))
+
+        if expected_types:
+            # check all plain types at once, before anything else
+            arg_predicates.insert(0, _TypeCheck(self._base_func, expected_types))
 
-        return _PartialFunction(predicate, self._base_func, self._base_func.args)
+        return arg_predicates[0] if len(arg_predicates) == 1 else _AllOf(self._base_func, arg_predicates)
 
-    def _make_type_predicate(self, predicate):
-        if isinstance(predicate, type):
-            def type_predicate(*args, **kwargs):
-                return all(isinstance(obj, predicate) for obj in args) \
-                       and all(isinstance(obj, predicate) for key, obj in kwargs.iteritems())
+    def _make_type_predicate(self, predicate, arg_names=None, plain_arg_names=None):
+        if arg_names is None:
+            arg_names, plain_arg_names = self._base_func.args, self._plain_arg_names
+        elif plain_arg_names is None:
+            plain_arg_names = arg_names
+
+        if isinstance(predicate, (type, _string_types)):
+            expected_types = [(arg_name, predicate) for arg_name in plain_arg_names]
 
         elif isinstance(predicate, dict):
-            if any((not isinstance(value, (type, collections.Iterable))) for value in predicate.values()):
+            if any((not isinstance(value, (type, Iterable))) for value in predicate.values()):
                 raise TypeError('In a dict that maps arguments to expected types, '
                                 'the values must be either types or iterables of types.')
-
-            def type_predicate(*args, **kwargs):
-                for arg_name, expected_arg_type in predicate.iteritems():
-                    arg_value = self._base_func.get_arg_value(arg_name, args, kwargs)
-
-                    if isinstance(expected_arg_type, collections.Iterable):
-                        expected_arg_type = tuple(expected_arg_type)
-
-                    if not isinstance(arg_value, expected_arg_type):
-                        return False
-                return True
+            if any(arg_name not in arg_names for arg_name in predicate):
+                raise ValueError('Argument specified in predicate doesn\'t exist in base function.')
+            expected_types = predicate.items()
 
         else:
             raise TypeError('A type predicate may be created from a type or a dictionary.')
 
-        return _PartialFunction(type_predicate, self._base_func, args=self._base_func.args)
+        return _TypeCheck(self._base_func, [(self._base_func.args.index(arg_name), expected_type)
+                                            for arg_name, expected_type in expected_types])
 
-    def _make_predicate_from_iterable(self, predicates, aggregator=all):
-        partial_func_predicates = map(self.make_predicate, predicates)
-
-        def composed_predicates(*args, **kwargs):
-            return aggregator(predicate(*args, **kwargs) for predicate in partial_func_predicates)
-
-        return _PartialFunction(composed_predicates, self._base_func, args=self._base_func.args)
+    def _make_predicate_from_iterable(self, predicates, arg_names, aggregator=all, plain_arg_names=None):
+        predicates = [self._make_predicate(predicate, arg_names, plain_arg_names) for predicate in predicates]
+        return _AnyOf(self._base_func, predicates) if aggregator is any else _AllOf(self._base_func, predicates)
 
     def _prepend_typecheck_to_predicate(self, prepend_typecheck, predicate):
-        if isinstance(prepend_typecheck, (type, dict)):
+        if isinstance(prepend_typecheck, (type, dict, _string_types)):
             type_checker = self._make_type_predicate(prepend_typecheck)
-        elif isinstance(prepend_typecheck, collections.Iterable):
-            type_checker = self._make_predicate_from_iterable(prepend_typecheck, aggregator=any)
+        elif isinstance(prepend_typecheck, Iterable):
+            type_checker = self._make_predicate_from_iterable(prepend_typecheck, self._base_func.args,
+                                                              aggregator=any, plain_arg_names=self._plain_arg_names)
         else:
             raise ValueError('type optional argument to when() has to be a type or an iterable of types. '
                              'Can\'t be a {}.'.format(type(prepend_typecheck)))
 
-        return self._make_predicate_from_iterable([type_checker, predicate])
+        return _AllOf(self._base_func, [type_checker, predicate])
 
     def _all_params_valid(self, function_info):
         return all(arg in self._base_func.args for arg in function_info.args)
 
 
-_PredicateFunctionMappping = namedtuple('PredicateFunctionMappping', ['predicate_info', 'func_info'])
+class genericmethod(generic):
+    """
+    A decorator to turn methods into generic methods. They're dispatched like generic functions, except that
+    plain types and value conditions given to when() (or as its `type` argument) check all arguments but
+    the receiver (`self`), whose class may still be checked by naming it:
+
+        class Renderer(object):
+            @genericmethod
+            def render(self, node):
+                raise TypeError()
+
+            @render.when(Image)  # node is an Image
+            def _image(self, node):
+                return '<img src="{}">'.format(node.url)
+
+            @render.when({'self': Printable, 'node': Table})
+            def _printable_table(self, node):
+                return self.paginate(node)
+
+    Like other generic functions, generic methods are bound without a dispatcher per instance,
+    and dispatch by the classes of the arguments whose types are checked - including the receiver's, if checked.
+    See extend() for overriding registrations in subclasses.
+    """
+
+    def __init__(self, wrapped, **options):
+        super(genericmethod, self).__init__(wrapped, **options)
+        if not self._base_func.parameters.positional:
+            raise TypeError('A generic method must take the receiver as its first argument.')
+
+    @property
+    def _plain_arg_names(self):
+        return self._base_func.parameters.positional[1:] + self._base_func.parameters.keyword_only
+
+
+def equals(value):
+    """
+    Make a predicate source for when(), True for arguments equal to the given (hashable) value.
+    Like a type, it checks every argument, unless given for a single argument in a dict:
+
+        @handle.when({'command': equals('start')})
+        def _start(command, payload):
+            ...
+
+    Unlike the equivalent lambda, generic functions index these conditions: consecutive registrations
+    whose predicates are conditions on the same argument made by equals(), one_of() or in_range()
+    are dispatched among by a hash table and a sorted table of ranges, rather than by testing them in turn.
+    """
+    return _ValueCondition(values=frozenset([value]))
+
+
+def one_of(values):
+    """Make a predicate source for when(), True for arguments equal to any of the given (hashable) values.
+    See equals().
+    """
+    return _ValueCondition(values=frozenset(values))
+
+
+def in_range(low=None, high=None):
+    """Make a predicate source for when(), True for arguments `low <= argument < high`,
+    either bound being omitted if None. Arguments that can't be compared to the bounds aren't in the range.
+    See equals().
+    """
+    if low is None and high is None:
+        raise ValueError('A range must have a low bound, a high bound or both.')
+    return _ValueCondition(low=low, high=high)
+
+
+def hint(predicate_source, cost=None, selectivity=None):
+    """
+    Make a predicate source for when(), evaluating like the given one, with hints of how costly it is
+    to evaluate (relative to a type check, which costs 1) and which fraction of calls it's True for.
+    The parts of a list of predicates, or of a dict, are evaluated cheapest and most decisive first by
+    these hints, rather than in the given order:
+
+        @handle.when([hint(is_in_cache_file, cost=500), {'request': Request}])  # checks the type first
+        def _cached(request):
+            ...
+
+    Type checks and value conditions are estimated to be cheap, and evaluated before predicates that aren't
+    hinted, which keep their given order among themselves. So the parts of a list may rely on the types
+    checked by it, and on other predicates given before them, unless they're hinted: hinted parts may be
+    evaluated in any order, so they mustn't rely on, nor be relied on by, other parts. Whichever the order,
+    the outcome is the same, though more or fewer of the parts may be evaluated.
+    """
+    if cost is not None and cost < 0:
+        raise ValueError('The cost of a predicate can\'t be negative.')
+    if selectivity is not None and not 0 <= selectivity <= 1:
+        raise ValueError('The selectivity of a predicate must be between 0 and 1.')
+    return _Hint(predicate_source, cost, selectivity)
+
+
+_Hint = namedtuple('Hint', ['predicate_source', 'cost', 'selectivity'])
+
+
+_PredicateFunctionMappping = namedtuple('PredicateFunctionMappping',
+                                        ['predicate_info', 'func_info', 'pure', 'vectorized', 'group',
+                                         'key',  # identifies the implementation, see _implementation_key()
+                                         'weak_refs',  # to the weakly held objects, see when(weak=True)
+                                         'memo'])  # the _LRUCache of results, see when(memoize=...), or None
+
+
+def _implementation_key(function):
+    """Identify an implementation by ids, so weakly held ones aren't kept alive by their registrations
+    (which are removed once they're collected, before their ids may be reused). Bound methods are made
+    upon attribute access, so they're identified by their instance and function.
+    """
+    if _is_bound_method(function):
+        return id(function.__self__), id(function.__func__)
+    return id(function)
+
+
+def _implementation_of(registration):
+    function = registration.func_info._function
+    return function.function if registration.memo is not None else function  # see _Memoized
+
+
+def _is_bound_method(function):
+    return inspect.ismethod(function) and function.__self__ is not None
+
+
+def _weakly_held(function, callback):
+    """Return a callable invoking the given function without holding it (or the instance of a bound method),
+    the function's _Parameters, and the weak reference to what isn't held, which calls the callback
+    once it's collected.
+    """
+    if _iscoroutinefunction(function):
+        raise ValueError('Coroutine functions can\'t be held weakly.')
+    parameters = _Parameters.of(function)
+    if _is_bound_method(function):
+        method_function, instance = function.__func__, weakref.ref(function.__self__, callback)
+
+        def invoke_method(*args, **kwargs):
+            return method_function(instance(), *args, **kwargs)
+        return invoke_method, parameters, instance
+    return weakref.proxy(function), parameters, weakref.ref(function, callback)
+
+
+def _is_alive(registration):
+    return all(ref() is not None for ref in registration.weak_refs)
+
+
+class _DispatchState(object):
+    """A snapshot of the registrations of a generic function, and the indexes derived from them.
+
+    Calls take the state once and only use it, while registration builds a new state and swaps it in,
+    so calls never see registrations partially updated, nor wait for them. The registrations and the order
+    of evaluation are never modified, but the caches derived from them are filled, or reset, as calls go.
+    """
+
+    __slots__ = ('_generic', '_registered', '_count', '_registrations', '_dispatch_order', '_select', 'typed_positions',
+                 'dispatch_on_types', 'checks_abcs', 'abc_cache_token', 'selectors_by_classes', 'decision_cache', 'call',
+                 'choose', 'batch_choosers', 'dispatchers_by_classes', 'fall_through_selector',
+                 'fall_through_dispatcher')
+
+    max_classes = 1024  # of arguments, for which selectors and dispatchers are kept, until they're all dropped
+
+    def __init__(self, generic_function, registrations, typed_positions, checks_abcs, abc_cache_token,
+                 decision_cache):
+        self._generic = generic_function
+        # a list of _PredicateFunctionMappping in order of registration, which later states may append to,
+        # so only its first `_count` are this state's
+        self._registered = registrations
+        self._count = len(registrations)
+        # made upon the first call, see registrations, dispatch_order and select
+        self._registrations = self._dispatch_order = self._select = None
+        self.typed_positions = typed_positions  # of the arguments whose types are checked, in order
+        self.dispatch_on_types = bool(typed_positions)  # whether selectors specialized by classes are used
+        self.checks_abcs = checks_abcs  # whether ABCs, or types referred to by dotted paths, are checked
+        self.abc_cache_token = abc_cache_token  # None unless ABCs are checked
+        self.selectors_by_classes = {}
+        self.decision_cache = decision_cache  # None unless some predicates are pure
+        self.call = None  # dispatches calls, taking the arguments of the base function
+        self.choose = None  # see generic._get_chooser
+        self.batch_choosers = None  # see generic._get_batch_chooser
+        self.dispatchers_by_classes = {}  # generated functions dispatching arguments of given classes
+        # shared by all classes of arguments no registration may match, made upon the first of them
+        self.fall_through_selector = self.fall_through_dispatcher = None
+
+    # like the dispatchers, these are made upon the first call rather than upon every registration,
+    # which would make registering many implementations quadratic. Calls making them concurrently make equal ones
+
+    @property
+    def registrations(self):
+        """The registrations, in order of registration, as a tuple."""
+        registrations = self._registrations
+        if registrations is None:
+            registrations = self._registrations = tuple(self._registered[:self._count])
+        return registrations
+
+    def followed_by(self, registration):
+        """Return a list of the registrations followed by the given one, for a new state. It's the list of this state
+        unless another one appended to it already, as appending doesn't change which registrations this state holds.
+        """
+        registered = self._registered
+        if len(registered) != self._count:
+            registered = registered[:self._count]
+        registered.append(registration)
+        return registered
+
+    @property
+    def dispatch_order(self):
+        """The registrations, in the order their predicates are evaluated."""
+        dispatch_order = self._dispatch_order
+        if dispatch_order is None:
+            dispatch_order = self._dispatch_order = self._generic._order_registrations(self.registrations)
+        return dispatch_order
+
+    @property
+    def select(self):
+        """Chooses the implementation regardless of the classes of the arguments."""
+        select = self._select
+        if select is None:
+            select = self._select = self._generic._make_selector(
+                [(registration.predicate_info, registration.func_info,
+                  registration.pure or registration.predicate_info.pure) for registration in self.dispatch_order])
+        return select
+
+
+def _bounded_insert(by_classes, classes, value):
+    """Insert into a mapping by classes of arguments, dropping all of its entries first if it's full.
+    Unlike evicting the least recently used entry, this keeps lookups as fast as those of a dict.
+    """
+    if len(by_classes) >= _DispatchState.max_classes:
+        by_classes.clear()
+    by_classes[classes] = value
+
+
+_CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+_DispatchStats = namedtuple('DispatchStats', ['registrations', 'default_calls', 'default_time'])
+
+_RegistrationStats = namedtuple('RegistrationStats', ['implementation', 'evaluations', 'matches',
+                                                      'predicate_time', 'implementation_time'])
+
+_Analysis = namedtuple('Analysis', ['shadowed', 'disjoint', 'overlapping'])
+
+_MemoryFootprint = namedtuple('MemoryFootprint', ['registrations', 'predicates', 'implementations', 'dispatch_index',
+                                                  'decision_cache', 'memoized_results', 'statistics', 'total'])
+
+_MemoInfo = namedtuple('MemoInfo', ['implementation', 'hits', 'misses', 'maxsize', 'currsize'])
+
+
+class _StatsCounter(object):
+    __slots__ = ('evaluations', 'matches', 'predicate_time', 'implementation_time')
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.evaluations = self.matches = 0
+        self.predicate_time = self.implementation_time = 0.0
+
+
+_timer = getattr(time, 'perf_counter', time.time)
+_clock = getattr(time, 'monotonic', time.time)  # of expiry, see _LRUCache
+
+
+def _timed_predicate(test, counter):
+    def timed_test(values):
+        start = _timer()
+        try:
+            return test(values)
+        finally:
+            counter.predicate_time += _timer() - start
+            counter.evaluations += 1
+    return timed_test
+
+
+class _GroupCounter(object):
+    """Observes the registration of a group, which is ordered by its score.
+
+    The score is the expected number of matches per second spent evaluating the predicate.
+    For mutually exclusive predicates, evaluating them by descending score minimizes the expected time to find
+    the one that matches. The time is sampled, to keep observing cheap, and only taken into account
+    once sampled a few times, as a single timing of a cheap predicate is mostly noise.
+    """
+
+    __slots__ = ('matches', 'evaluations', 'sampled_time', 'samples')
+
+    sample_every = 64  # evaluations
+    min_samples = 4
+
+    def __init__(self):
+        self.matches = self.evaluations = self.samples = 0
+        self.sampled_time = 0.0
+
+    @property
+    def cost(self):
+        return self.sampled_time / self.samples if self.samples >= self.min_samples else None
+
+    def score(self, unknown_cost):
+        cost = self.cost if self.cost is not None else unknown_cost
+        return self.matches / cost if cost > 0 else float('inf') if self.matches else 0.0
+
+    def decay(self):
+        # weigh the matches observed lately more than earlier ones, to follow changes in the traffic
+        self.matches /= 2
+
+
+def _sampled_predicate(test, counter):
+    def sampled_test(values):
+        evaluations = counter.evaluations
+        counter.evaluations = evaluations + 1
+        if evaluations % counter.sample_every:
+            return test(values)
+
+        start = _timer()
+        try:
+            return test(values)
+        finally:
+            counter.sampled_time += _timer() - start
+            counter.samples += 1
+    return sampled_test
+
+
+def _timed_implementation(function, counter):
+    def timed_function(values):
+        start = _timer()
+        try:
+            return function(values)
+        finally:
+            counter.implementation_time += _timer() - start
+            counter.matches += 1
+    return timed_function
+
+
+def _invoke_chunk(generic_function, calls):
+    """Invoke a generic function on each tuple of positional arguments, as a task of generic.map_parallel()."""
+    return list(generic_function.imap(calls, chunk_size=len(calls)))
+
+
+_builtin_type = type  # when() takes an argument called `type`
+
+
+def _take_rows(columns, rows, length):
+    """Return the given rows of each of the columns."""
+    if len(rows) == length:
+        return columns
+    return tuple(column.take(rows) if hasattr(column, 'take') else [column[row] for row in rows]
+                 for column in columns)
+
+
+_cell_type = _builtin_type((lambda value: lambda: value)(None).__closure__[0])
+
+
+def _cache_footprint(cache):
+    """Return the size in bytes of an _LRUCache, with the keys of its entries but not the values they hold."""
+    return (sys.getsizeof(cache) + sys.getsizeof(cache._entries) +
+            sum(sys.getsizeof(key) + (sys.getsizeof(entry) if cache.ttl is not None else 0)
+                for key, entry in list(cache._entries.items())))
+
+
+def _slot_value(obj, cls, name):
+    try:
+        return cls.__dict__[name].__get__(obj, cls)
+    except (AttributeError, KeyError):
+        return None
+
+
+def _footprint(roots, seen):
+    """Return the size in bytes of the objects and the objects they reference that were allocated by this module:
+    containers, instances of its classes, and functions defined in it with their closures, but not other generic
+    functions. Objects whose ids are in `seen` aren't accounted, and the ids of those accounted are added to it.
+    """
+    size = 0
+    stack = list(roots)
+    while stack:
+        obj = stack.pop()
+        if id(obj) in seen:
+            continue
+
+        if isinstance(obj, dict):
+            referents = itertools.chain(obj.keys(), obj.values())
+        elif isinstance(obj, (tuple, list, set, frozenset)):
+            referents = obj
+        elif (isinstance(obj, types.FunctionType) and obj.__module__ == __name__
+              and globals().get(obj.__name__) is not obj):  # module level functions aren't allocated per generic
+            referents = (obj.__closure__ or ()) + (obj.__defaults__ or ())
+            if obj.__globals__ is not globals():  # generated by _CodeBuilder
+                referents += (obj.__globals__,)
+        elif isinstance(obj, types.MethodType) and _builtin_type(obj.__self__).__module__ == __name__:
+            referents = (obj.__self__,)
+        elif isinstance(obj, _cell_type):
+            try:
+                referents = (obj.cell_contents,)
+            except ValueError:  # empty cell
+                referents = ()
+        elif isinstance(obj, operator.itemgetter):
+            referents = ()
+        elif _builtin_type(obj).__module__ == __name__ and not isinstance(obj, generic):
+            # slots are read by their descriptors, so properties made upon first access aren't made by accounting
+            referents = [_slot_value(obj, cls, name) for cls in _builtin_type(obj).__mro__
+                         for name in getattr(cls, '__slots__', ())]
+            referents.extend(getattr(obj, '__dict__', {}).values())
+        else:
+            continue  # not allocated here
+
+        seen.add(id(obj))
+        size += sys.getsizeof(obj)
+        stack.extend(referents)
+    return size
+
+
+try:
+    from abc import get_cache_token as _get_cache_token
+except ImportError:  # python 2
+    def _get_cache_token():
+        return ABCMeta._abc_invalidation_counter
+
+
+def _get_type_cache_token():
+    """Return a number that changes whenever ABCs get new virtual subclasses registered, or referenced types
+    get resolved, after which the outcome of type checks may change for classes they were evaluated for.
+    """
+    return _get_cache_token() + _LazyType.resolutions
+
+
+try:
+    _string_types = (basestring,)
+except NameError:  # python 3
+    _string_types = (str,)
+
+
+class _Parameters(object):
+    """The parameters of a function by kind, analysed once so that binding arguments to them,
+    and passing them on, never inspects the function again.
+
+    `names` lists all parameters in the order the values of arguments are held (see _FunctionInfo.bind):
+    the positional ones, then those of *args, of the keyword-only ones and of **kwargs.
+
+    Parameters without defaults are shared by all functions with the same signature (see interned()),
+    as large registries hold many functions taking the same arguments. They're never modified.
+    """
+
+    __slots__ = ('positional', 'varargs', 'keyword_only', 'varkw', 'defaults', 'names', 'only_positional',
+                 '__weakref__')
+
+    _interned = weakref.WeakValueDictionary()  # by signature
+
+    def __init__(self, positional, varargs=None, keyword_only=(), varkw=None, defaults=None):
+        self.positional = tuple(positional)
+        self.varargs = varargs  # the name of *args, if taken
+        self.keyword_only = tuple(keyword_only)
+        self.varkw = varkw  # the name of **kwargs, if taken
+        self.defaults = defaults or _no_defaults  # by name
+        self.only_positional = varargs is None and not self.keyword_only and varkw is None
+        if self.only_positional:
+            self.names = self.positional
+        else:
+            self.names = (self.positional + ((varargs,) if varargs is not None else ()) + self.keyword_only +
+                          ((varkw,) if varkw is not None else ()))
+
+    @classmethod
+    def interned(cls, positional, varargs=None, keyword_only=(), varkw=None):
+        """Return the parameters of this signature, without defaults, shared with other functions taking them."""
+        key = (tuple(positional), varargs, tuple(keyword_only), varkw)
+        parameters = cls._interned.get(key)
+        if parameters is None:
+            parameters = cls._interned.setdefault(key, cls(*key))
+        return parameters
+
+    @classmethod
+    def of(cls, function):
+        code = function.__code__
+        positional = code.co_varnames[:code.co_argcount]
+        end = code.co_argcount + getattr(code, 'co_kwonlyargcount', 0)  # python 2 has no keyword-only parameters
+        keyword_only = code.co_varnames[code.co_argcount:end]
+        varargs = varkw = None
+        if code.co_flags & inspect.CO_VARARGS:
+            varargs = code.co_varnames[end]
+            end += 1
+        if code.co_flags & inspect.CO_VARKEYWORDS:
+            varkw = code.co_varnames[end]
+
+        positional_defaults = function.__defaults__ or ()
+        defaults = dict(zip(positional[len(positional) - len(positional_defaults):], positional_defaults))
+        defaults.update(getattr(function, '__kwdefaults__', None) or {})
+        if inspect.ismethod(function):
+            positional = positional[1:]  # strip self argument
+        if not defaults:
+            return cls.interned(positional, varargs, keyword_only, varkw)
+        return cls(positional, varargs, keyword_only, varkw, defaults)
+
+
+_no_defaults = {}  # shared by all parameters without defaults, so it's never modified
+
+
+_missing = object()
+
+if sys.version_info[0] >= 3:
+    _multiple_values_message = '{}() got multiple values for argument \'{}\''
+else:
+    _multiple_values_message = '{}() got multiple values for keyword argument \'{}\''
 
 
 class _FunctionInfo(object):
-    def __init__(self, function=None, args=None):
+    __slots__ = ('_function', 'parameters', 'args', '_invoke_values', '_interned')
+
+    def __init__(self, function=None, args=None, parameters=None):
         self._function = function if function is not None else lambda *args, **kwargs: None
+        self._interned = None
 
-        if args is None:
-            self.args = function.__code__.co_varnames[:function.__code__.co_argcount]
-            if inspect.ismethod(function):
-                self.args = self.args[1:]  # strip self argument
-        else:
-            self.args = args
+        if parameters is None:
+            parameters = _Parameters.of(function) if args is None else _Parameters.interned(args)
+        self.parameters = parameters
+        self.args = parameters.names
+        self._invoke_values = None
 
     def __call__(self, *args, **kwargs):
+        return self.invoke(*args, **kwargs)
+
+    def invoke(self, *args, **kwargs):
         return self._function(*args, **kwargs)
 
-    def get_arg_value(self, arg_name, input_args, input_kwargs):
+    @property
+    def invoke_values(self):
+        """A callable invoking the function given the values of all arguments (see bind()). Calls are dispatched
+        by generated code invoking functions directly, so it's made upon first access rather than for every one.
+        """
+        invoke_values = self._invoke_values
+        if invoke_values is None:
+            invoke_values = self._invoke_values = self._make_values_invoker()
+        return invoke_values
+
+    def _make_values_invoker(self):
+        function = self._function
+        if not self.parameters.only_positional:
+            return _make_invoker(function, self.parameters, range(len(self.args)))
+        return lambda values: function(*values)
+
+    def clear_interned(self):
+        """Drop the objects shared by intern(), and stop sharing objects."""
+        self._interned = False
+
+    def intern(self, value, make=None):
+        """Return an object equal to the given hashable one (e.g. a tuple of argument names, or a frozenset of types),
+        shared by all functions and predicates over this function holding equal ones, so large registries
+        hold one copy of each. If `make` is given, return the object it makes for the value instead,
+        calling it only the first time.
+        """
+        if make is None and value == self.args:
+            return self.args
+        if self._interned is False:
+            return value if make is None else make(value)
+        if self._interned is None:
+            self._interned = {}
+        key = value if make is None else (make, value)
         try:
-            return input_kwargs[arg_name]
+            return self._interned[key]
         except KeyError:
-            pass
+            return self._interned.setdefault(key, value if make is None else make(value))
+
+    def bind(self, input_args, input_kwargs):
+        """Return the values of all arguments of a call to this function, as a tuple ordered like self.args."""
+        if not self.parameters.only_positional or self.parameters.defaults:
+            return self._bind_parameters(input_args, input_kwargs)
+        if not input_kwargs and len(input_args) == len(self.args):
+            return input_args
+
+        if any(kwarg not in self.args for kwarg in input_kwargs):
+            raise ValueError('One or more keyword arguments don\'t exist in the generic function.')
+        if len(input_args) > len(self.args):
+            raise ValueError('Received too many positional arguments.')
+
+        for arg_name in self.args[:len(input_args)]:
+            if arg_name in input_kwargs:
+                raise TypeError(_multiple_values_message.format(self._name, arg_name))
         try:
-            arg_index = self.args.index(arg_name)
-            return input_args[arg_index]
-        except IndexError:
-            raise ValueError('Specified argument doesn\'t exist in generic function.')
+            return tuple(input_args) + tuple([input_kwargs[arg_name] for arg_name in self.args[len(input_args):]])
+        except KeyError:
+            raise TypeError('{}() takes exactly {} arguments ({} given)'
+                            .format(self._name, len(self.args), len(input_args) + len(input_kwargs)))
+
+    def _bind_parameters(self, input_args, input_kwargs):
+        """Like bind(), for functions with defaults, *args, keyword-only parameters or **kwargs."""
+        parameters = self.parameters
+        positional = parameters.positional
+        by_keyword = positional + parameters.keyword_only
+        if parameters.varkw is None and any(kwarg not in by_keyword for kwarg in input_kwargs):
+            raise ValueError('One or more keyword arguments don\'t exist in the generic function.')
+        if parameters.varargs is None and len(input_args) > len(positional):
+            raise ValueError('Received too many positional arguments.')
+
+        for arg_name in positional[:len(input_args)]:
+            if arg_name in input_kwargs:
+                raise TypeError(_multiple_values_message.format(self._name, arg_name))
+
+        values = list(input_args[:len(positional)])
+        missing = []
+        for arg_name in positional[len(input_args):] + parameters.keyword_only:
+            value = input_kwargs.get(arg_name, parameters.defaults.get(arg_name, _missing))
+            if value is _missing:
+                missing.append(arg_name)
+            values.append(value)
+        if missing:
+            raise TypeError('{}() missing required arguments: {}'.format(self._name, ', '.join(
+                '\'{}\''.format(arg_name) for arg_name in missing)))
+
+        if parameters.varargs is not None:
+            values.insert(len(positional), tuple(input_args[len(positional):]))
+        if parameters.varkw is not None:
+            values.append(dict((kwarg, value) for kwarg, value in input_kwargs.items() if kwarg not in by_keyword))
+        return tuple(values)
+
+    @property
+    def _name(self):
+        return getattr(self._function, '__name__', 'function')
 
 
 class _PartialFunction(_FunctionInfo):
@@ -243,19 +1958,1044 @@ class _PartialFunction(_FunctionInfo):
     only those that are of interest to the partial function.
     This is done using the argument names specified by the base function (via self._base_function.args)
     and the args of the partial function (self.args).
+
+    *args or **kwargs not taken by the base function take whatever arguments the other parameters don't,
+    of those given as `leftover_args` (by default, all of the base function's): *args by position, in order,
+    otherwise **kwargs by name.
     """
 
-    def __init__(self, function, base_function, args=None):
-        super(_PartialFunction, self).__init__(function, args)
+    __slots__ = ('_base_function',)
+
+    def __init__(self, function, base_function, args=None, parameters=None, leftover_args=None):
         self._base_function = base_function
+        super(_PartialFunction, self).__init__(function, args, parameters)
+        parameters = self.parameters
+        base_args = base_function.args
+        takes_leftovers = [arg_name is not None and arg_name not in base_args
+                           for arg_name in (parameters.varargs, parameters.varkw)]
+        if any(takes_leftovers):
+            self.parameters = _taking_leftovers(parameters, takes_leftovers,
+                                                base_args if leftover_args is None else leftover_args)
+            self.args = self.parameters.names
+        self.args = base_function.intern(self.args)
+
+    def invoke(self, *args, **kwargs):
+        return self.invoke_values(self._base_function.bind(args, kwargs))
+
+    def _make_values_invoker(self):
+        """Compute the projection of the base function's arguments onto the arguments of this function once,
+        and return a callable specialized to perform it.
+        The returned callable takes the values of all of the base function's arguments (see _FunctionInfo.bind),
+        picks the arguments of this function by their precomputed index,
+        and passes them in the order this function expects them.
+        """
+        function = self._function
+        base_args = tuple(self._base_function.args)
+        args = tuple(self.args)
+
+        if args == base_args and self.parameters.only_positional:
+            return lambda values: function(*values)  # nothing to filter out
+
+        if any(arg_name not in base_args for arg_name in args):
+            # such functions are rejected upon registration, so this can only be reached by invoking them directly
+            def invoke_values(values):
+                raise ValueError('Argument specified in function doesn\'t exist in base function.')
+            return invoke_values
+
+        indexes = tuple(base_args.index(arg_name) for arg_name in args)
+
+        if not self.parameters.only_positional:
+            return _make_invoker(function, self.parameters, indexes)
+
+        if not indexes:
+            return lambda values: function()
+
+        elif len(indexes) == 1:
+            index = indexes[0]
+            return lambda values: function(values[index])
+
+        else:
+            get_args = operator.itemgetter(*indexes)
+            return lambda values: function(*get_args(values))
+
+
+def _taking_leftovers(parameters, takes_leftovers, leftover_args):
+    """Return the parameters a function with the given ones is called through, passing it the arguments named by
+    `leftover_args` that it doesn't take otherwise: as more positional arguments if its *args takes leftovers,
+    otherwise as more keyword arguments if its **kwargs does (see _PartialFunction).
+    """
+    varargs_takes_leftovers, varkw_takes_leftovers = takes_leftovers
+    varargs = None if varargs_takes_leftovers else parameters.varargs
+    varkw = None if varkw_takes_leftovers else parameters.varkw
+    taken = parameters.positional + parameters.keyword_only + (varargs, varkw)
+    leftovers = tuple(arg_name for arg_name in leftover_args if arg_name not in taken)
+    positional, keyword_only = parameters.positional, parameters.keyword_only
+    if varargs_takes_leftovers:
+        positional += leftovers
+    else:
+        keyword_only += leftovers
+    if parameters.defaults:
+        return _Parameters(positional, varargs, keyword_only, varkw, parameters.defaults)
+    return _Parameters.interned(positional, varargs, keyword_only, varkw)
+
+
+def _make_invoker(function, parameters, indexes):
+    """Return a callable invoking a function given the values of all arguments of a base function,
+    passing each parameter of the function (given as _Parameters) the value at the corresponding index:
+    positional parameters by position, keyword-only ones by name, and *args and **kwargs unpacked.
+    """
+    index_by_name = dict(zip(parameters.names, indexes))
+    positional_indexes = tuple(index_by_name[arg_name] for arg_name in parameters.positional)
+    varargs_index = index_by_name.get(parameters.varargs)
+    keyword_indexes = tuple((arg_name, index_by_name[arg_name]) for arg_name in parameters.keyword_only)
+    varkw_index = index_by_name.get(parameters.varkw)
+
+    def invoke_values(values):
+        args = [values[index] for index in positional_indexes]
+        if varargs_index is not None:
+            args.extend(values[varargs_index])
+        kwargs = dict((arg_name, values[index]) for arg_name, index in keyword_indexes)
+        if varkw_index is not None:
+            kwargs.update(values[varkw_index])
+        return function(*args, **kwargs)
+    return invoke_values
+
+
+class _Predicate(object):
+    """A predicate compiled against the arguments of a base function.
+
+    Compiled predicates are evaluated via their `test` attribute, a callable taking the values
+    of all of the base function's arguments (see _FunctionInfo.bind), so each part of a predicate
+    picks the arguments it needs by a precomputed index.
+
+    Predicates may also be specialized for the classes of the arguments ahead of time,
+    which is how generic functions avoid re-evaluating type checks on every call.
+    """
+
+    __slots__ = ('_base_function', 'args', 'test', 'types', 'pure', 'cost', 'selectivity')
+
+    def __init__(self, base_function, args):
+        self._base_function = base_function
+        self.args = base_function.intern(tuple(args))
+        self.types = base_function.intern(frozenset())  # the types checked by the predicate
+        self.pure = False  # whether the predicate is known to depend on nothing but the values of the arguments
+        # estimates of the cost of evaluating the predicate, relative to a type check, and of the fraction
+        # of calls it's True for. A predicate of unknown cost may rely on the predicates preceding it
+        self.cost = None
+        self.selectivity = None
+
+    def hint(self, cost=None, selectivity=None):
+        """Override the estimates of the predicate by those given (see hint())."""
+        if cost is not None:
+            self.cost = cost
+        if selectivity is not None:
+            self.selectivity = selectivity
+        if self.cost is None:
+            self.cost = _UNKNOWN_COST  # hinted predicates don't rely on others
+
+    @property
+    def key(self):
+        """Predicates with equal keys always evaluate the same. Only generated dispatch needs keys, to evaluate
+        shared parts of predicates once, so they're made upon access rather than held by every predicate.
+        """
+        return None
+
+    def __call__(self, *args, **kwargs):
+        return self.test(self._base_function.bind(args, kwargs))
+
+    def specialize(self, classes):
+        """Return True or False if the classes of the arguments alone decide the outcome of the predicate,
+        otherwise return the predicate that is left to evaluate on arguments of these classes.
+        """
+        return self
+
+    def test_async(self, values):
+        """Like test(), but awaits awaitable outcomes of callables: returns an asyncio Future of the outcome
+        if one was encountered, otherwise the outcome itself.
+        """
+        return self.test(values)
+
+    def source(self, code):
+        """Return the source of an expression evaluating the predicate, in code generated by the given _CodeBuilder."""
+        return '{}({})'.format(code.ref(self.test), code.values)
+
+
+class _CallablePredicate(_Predicate):
+    __slots__ = ('function',)
+
+    def __init__(self, base_function, partial_function):
+        super(_CallablePredicate, self).__init__(base_function, partial_function.args)
+        self.function = partial_function
+
+    @property
+    def test(self):
+        if _iscoroutinefunction(self.function._function):
+            return self._refuse_test
+        return self.function.invoke_values  # made upon first access, see _FunctionInfo.invoke_values
+
+    @property
+    def key(self):
+        return _identity_key(self.function._function), self.args
+
+    def source(self, code):
+        if _iscoroutinefunction(self.function._function):
+            return super(_CallablePredicate, self).source(code)  # which refuses
+        return code.call(self.function)
+
+    def _refuse_test(self, values):
+        raise TypeError('The predicate {!r} is a coroutine function, so it may only be evaluated by call_async().'
+                        .format(self.function._function))
+
+    def test_async(self, values):
+        outcome = self.function.invoke_values(values)
+        return asyncio.ensure_future(outcome) if _isawaitable(outcome) else outcome
+
+
+class _TypeCheck(_Predicate):
+    """Checks the types of some of the arguments.
+    Like functools.singledispatch, this is resolved by the classes of the arguments,
+    so it may be specialized for them ahead of time.
+    """
+
+    __slots__ = ('checks',)
+
+    def __init__(self, base_function, expected_types):
+        checks = base_function.intern(tuple(
+            (index, tuple(_type_reference(t) for t in expected_type)
+             if isinstance(expected_type, Iterable) and not isinstance(expected_type, _string_types)
+             else (_type_reference(expected_type),))
+            for index, expected_type in expected_types))
+        super(_TypeCheck, self).__init__(base_function, tuple(base_function.args[index] for index, _ in checks))
+        self.checks = checks
+        self.pure = True
+        self.cost = 1.0
+        self.types = base_function.intern(frozenset(t for _, expected_types in checks for t in expected_types))
+        self.test = base_function.intern(checks, _make_type_test)
+
+    @property
+    def key(self):
+        return _TypeCheck, self.checks
+
+    def specialize(self, classes):
+        return all(issubclass(classes[index], expected_types) for index, expected_types in self.checks)
+
+    def source(self, code):
+        return '({})'.format(' and '.join(
+            '{}({}, {})'.format(code.ref(isinstance), code.arg_names[index],
+                                code.ref(expected_types[0] if len(expected_types) == 1 else expected_types))
+            for index, expected_types in self.checks))
+
+
+class _LazyType(object):
+    """A reference to a type by its dotted path, resolved once its module is imported.
+    isinstance() and issubclass() take it like the type: until the module is imported, no object can be
+    an instance of the type, nor a class its subclass.
+    """
+
+    __slots__ = ('path', '_type')
+
+    resolutions = 0  # of all references, counted so what was derived from unresolved ones can be dropped
+
+    def __init__(self, path):
+        if '.' not in path.strip('.'):
+            raise ValueError('A type must be referred to by its dotted path, e.g. \'numpy.ndarray\', not {!r}.'
+                             .format(path))
+        self.path = path
+        self._type = None
+
+    def resolve(self):
+        """Return the referenced type, or None if its module isn't imported yet."""
+        if self._type is None:
+            parts = self.path.split('.')
+            for split in range(len(parts) - 1, 0, -1):
+                obj = sys.modules.get('.'.join(parts[:split]))
+                if obj is None:
+                    continue
+                try:
+                    for name in parts[split:]:
+                        obj = getattr(obj, name)
+                except AttributeError:  # e.g. a submodule that isn't imported, or a module still being imported
+                    return None
+                if not isinstance(obj, type):
+                    raise TypeError('{} is not a type.'.format(self.path))
+                self._type = obj
+                _LazyType.resolutions += 1
+                break
+        return self._type
+
+    def __instancecheck__(self, instance):
+        resolved = self.resolve()
+        return resolved is not None and isinstance(instance, resolved)
+
+    def __subclasscheck__(self, cls):
+        resolved = self.resolve()
+        return resolved is not None and issubclass(cls, resolved)
+
+    def __eq__(self, other):
+        return isinstance(other, _LazyType) and other.path == self.path
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((_LazyType, self.path))
+
+    def __repr__(self):
+        return '<type {!r}>'.format(self.path)
+
+
+def _type_reference(expected_type):
+    """Return the given type, or a _LazyType for the dotted path of one."""
+    return _LazyType(expected_type) if isinstance(expected_type, _string_types) else expected_type
+
+
+class _ValueCondition(object):
+    """A condition on the value of an argument: being one of some values, or within a range."""
+
+    __slots__ = ('values', 'low', 'high')
+
+    def __init__(self, values=None, low=None, high=None):
+        self.values = values  # a frozenset, or None for a range
+        self.low = low
+        self.high = high
+
+    @property
+    def key(self):
+        return self.values, self.low, self.high
+
+    def matches(self, value):
+        if self.values is not None:
+            try:
+                return value in self.values
+            except TypeError:  # unhashable
+                return any(value == expected for expected in self.values)
+        try:
+            return (self.low is None or self.low <= value) and (self.high is None or value < self.high)
+        except TypeError:  # not comparable to the bounds
+            return False
+
+
+class _ValueCheck(_Predicate):
+    """Checks the value of an argument by a _ValueCondition.
+    Unlike callables, generic functions may index these checks (see _ValueIndex).
+    """
+
+    __slots__ = ('index', 'condition')
+
+    def __init__(self, base_function, index, condition):
+        super(_ValueCheck, self).__init__(base_function, (base_function.args[index],))
+        self.index = index
+        self.condition = condition
+        self.pure = True
+        self.cost = 1.0
+        matches = condition.matches
+        self.test = lambda values: matches(values[index])
+
+    @property
+    def key(self):
+        return _ValueCheck, self.index, self.condition.key
+
+    def source(self, code):
+        # not inlined as a comparison: values are tested like set members, by identity before equality
+        # (as by _ValueIndex), and ranges may not compare
+        return '{}({})'.format(code.ref(self.condition.matches), code.arg_names[self.index])
+
+
+class _ValueIndex(object):
+    """Finds the first of a sequence of value conditions that a value satisfies, by a hash table of the values
+    of the conditions, and a sorted table of the segments between the bounds of their ranges,
+    each mapped to the first range containing it.
+    Values the tables can't be used for (e.g. unhashable ones) are tested against the conditions in turn.
+    """
+
+    min_conditions = 4  # below which testing the conditions in turn is about as fast
+
+    def __init__(self, conditions):
+        self._conditions = conditions
+        self._positions_by_value = {}
+        ranges = []
+        for position, condition in enumerate(conditions):
+            if condition.values is not None:
+                for value in condition.values:
+                    self._positions_by_value.setdefault(value, position)
+            else:
+                ranges.append((position, condition))
+
+        try:
+            self._bounds = sorted(set(bound for _, condition in ranges for bound in (condition.low, condition.high)
+                                      if bound is not None))
+        except TypeError:  # incomparable bounds
+            self._bounds = None
+            self._ranges = ranges
+            return
+        self._ranges = None
+
+        # the segment i is [bounds[i - 1], bounds[i]), the first and last being unbounded
+        self._positions_by_segment = [None] * (len(self._bounds) + 1)
+        for position, condition in ranges:
+            first = 0 if condition.low is None else bisect.bisect_left(self._bounds, condition.low) + 1
+            last = len(self._bounds) if condition.high is None else bisect.bisect_left(self._bounds, condition.high)
+            for segment in range(first, last + 1):
+                if self._positions_by_segment[segment] is None:
+                    self._positions_by_segment[segment] = position
+
+    def __call__(self, value):
+        """Return the position of the first condition the value satisfies, or None."""
+        try:
+            position = self._positions_by_value.get(value)
+            if self._bounds is None:
+                if self._ranges:
+                    return self._scan(value)
+                return position
+
+            range_position = self._positions_by_segment[bisect.bisect_right(self._bounds, value)]
+        except TypeError:  # unhashable or incomparable
+            return self._scan(value)
+
+        if range_position is None or (position is not None and position < range_position):
+            return position
+        if not self._conditions[range_position].matches(value):  # e.g. NaN, which isn't ordered
+            return self._scan(value)
+        return range_position
+
+    def _scan(self, value):
+        for position, condition in enumerate(self._conditions):
+            if condition.matches(value):
+                return position
+        return None
+
+
+def _make_type_test(checks):
+    if len(checks) == 1:
+        (index, expected_types), = checks
+        return lambda values: isinstance(values[index], expected_types)
+
+    def test(values):
+        for index, expected_types in checks:
+            if not isinstance(values[index], expected_types):
+                return False
+        return True
+    return test
+
+
+class _CompoundPredicate(_Predicate):
+    __slots__ = ('predicates',)
+
+    def __init__(self, base_function, predicates):
+        flattened = []
+        for predicate in predicates:
+            if type(predicate) is type(self):
+                flattened.extend(predicate.predicates)
+            else:
+                flattened.append(predicate)
+
+        args = []
+        for predicate in flattened:
+            args.extend(arg_name for arg_name in predicate.args if arg_name not in args)
+
+        super(_CompoundPredicate, self).__init__(base_function, tuple(args))
+        flattened = self._cheapest_first(flattened)
+        self.predicates = tuple(flattened)
+        self._estimate(flattened)
+        self.pure = all(predicate.pure for predicate in flattened)
+        self.types = base_function.intern(frozenset().union(*(predicate.types for predicate in flattened)))
+        self.test = self._make_test(tuple(predicate.test for predicate in flattened))
+
+    decisive_outcome = None  # the outcome of a part which decides the outcome of the whole predicate
+    source_operator = None  # the operator joining the parts in generated code
+
+    @property
+    def key(self):
+        return type(self), tuple(predicate.key for predicate in self.predicates)
+
+    def _cheapest_first(self, predicates):
+        """Order the parts by the expected cost of evaluating them until one decides the outcome:
+        parts deciding it at less cost per chance of deciding it first. Parts of unknown cost are all ranked
+        the same, so the sort being stable, they keep their order among themselves.
+        """
+        def rank(predicate):
+            if predicate.cost is None:
+                return _UNKNOWN_COST / _UNKNOWN_SELECTIVITY
+            decisive_chance = _selectivity(predicate) if self.decisive_outcome else 1 - _selectivity(predicate)
+            return predicate.cost / decisive_chance if decisive_chance > 0 else float('inf')
+        return sorted(predicates, key=rank)
+
+    def _estimate(self, predicates):
+        """Estimate the cost and selectivity of the whole from those of its parts, as evaluated in order,
+        if all of them are known.
+        """
+        if any(predicate.cost is None for predicate in predicates):
+            return
+        cost, undecided_chance = 0.0, 1.0
+        for predicate in predicates:
+            cost += undecided_chance * predicate.cost
+            undecided_chance *= 1 - _selectivity(predicate) if self.decisive_outcome else _selectivity(predicate)
+        self.cost = cost
+        self.selectivity = 1 - undecided_chance if self.decisive_outcome else undecided_chance
+
+    def _make_test(self, tests):
+        raise NotImplementedError()
+
+    def source(self, code):
+        return '({})'.format(' {} '.format(self.source_operator).join(predicate.source(code)
+                                                                      for predicate in self.predicates))
+
+    def test_async(self, values, start=0):
+        for index in range(start, len(self.predicates)):
+            outcome = self.predicates[index].test_async(values)
+            if _isfuture(outcome):
+                return _then(outcome, lambda outcome, index=index:
+                             self.decisive_outcome if bool(outcome) is self.decisive_outcome
+                             else self.test_async(values, index + 1))
+            if bool(outcome) is self.decisive_outcome:
+                return self.decisive_outcome
+        return not self.decisive_outcome
+
+
+class _AllOf(_CompoundPredicate):
+    __slots__ = ()
+
+    decisive_outcome = False
+    source_operator = 'and'
+
+    def _make_test(self, tests):
+        # spare the loop for the short conjunctions dict predicates and type= preconditions usually make
+        if len(tests) == 1:
+            return tests[0]
+        elif len(tests) == 2:
+            first, second = tests
+            return lambda values: first(values) and second(values)
+        elif len(tests) == 3:
+            first, second, third = tests
+            return lambda values: first(values) and second(values) and third(values)
+
+        def test(values):
+            for test in tests:
+                if not test(values):
+                    return False
+            return True
+        return test
+
+    def specialize(self, classes):
+        remaining = []
+        for predicate in self.predicates:
+            specialized = predicate.specialize(classes)
+            if specialized is False:
+                return False
+            if specialized is not True:
+                remaining.append(specialized)
+
+        if not remaining:
+            return True
+        return remaining[0] if len(remaining) == 1 else _AllOf(self._base_function, remaining)
+
+
+class _AnyOf(_CompoundPredicate):
+    __slots__ = ()
+
+    decisive_outcome = True
+    source_operator = 'or'
+
+    def _make_test(self, tests):
+        if len(tests) == 1:
+            return tests[0]
+        elif len(tests) == 2:
+            first, second = tests
+            return lambda values: first(values) or second(values)
+
+        def test(values):
+            for test in tests:
+                if test(values):
+                    return True
+            return False
+        return test
+
+    def specialize(self, classes):
+        remaining = []
+        for predicate in self.predicates:
+            specialized = predicate.specialize(classes)
+            if specialized is True:
+                return True
+            if specialized is not False:
+                remaining.append(specialized)
+
+        if not remaining:
+            return False
+        return remaining[0] if len(remaining) == 1 else _AnyOf(self._base_function, remaining)
+
+
+def _identity_key(function):
+    """Return a hashable key identifying a callable, under which bound methods of the same object are equal."""
+    method_function = getattr(function, '__func__', None)
+    if method_function is not None:
+        return id(function.__self__), method_function
+    try:
+        hash(function)
+    except TypeError:
+        return id(function)
+    return function
+
+
+def _classes_at(positions, values):
+    """Return the classes of the values at the given positions, which selectors specialized by classes are keyed by."""
+    return tuple([values[position].__class__ for position in positions])
+
+
+_UNKNOWN_COST = 10.0  # predicates not known to be cheap are estimated to cost as much as 10 type checks
+_UNKNOWN_SELECTIVITY = 0.5
+
+
+def _selectivity(predicate):
+    return predicate.selectivity if predicate.selectivity is not None else _UNKNOWN_SELECTIVITY
+
+
+def _checks_abcs(predicate):
+    """Return whether a predicate checks ABCs, or types referred to by dotted paths, which may be ABCs."""
+    return any(isinstance(t, (ABCMeta, _LazyType)) for t in predicate.types)
+
+
+def _type_checked_positions(predicate):
+    """Return the positions of the arguments whose types a predicate checks."""
+    if isinstance(predicate, _TypeCheck):
+        return [index for index, _ in predicate.checks]
+    if isinstance(predicate, _CompoundPredicate):
+        return [position for part in predicate.predicates for position in _type_checked_positions(part)]
+    return []
+
+
+def _type_alternatives(predicate):
+    """Return the type checks implied by a predicate being True, as a list of alternatives, of which at least one
+    holds: each a list of (position, types) pairs, requiring the argument at the position to be an instance
+    of one of the types. Also returns whether the predicate is True whenever an alternative holds.
+    """
+    if isinstance(predicate, _TypeCheck):
+        return [list(predicate.checks)], True
+    if isinstance(predicate, _AllOf):
+        alternatives, exact = [[]], True
+        for part in predicate.predicates:
+            part_alternatives, part_exact = _type_alternatives(part)
+            alternatives = [checks + part_checks for checks in alternatives for part_checks in part_alternatives]
+            exact = exact and part_exact
+        return alternatives, exact
+    if isinstance(predicate, _AnyOf):
+        alternatives, exact = [], True
+        for part in predicate.predicates:
+            part_alternatives, part_exact = _type_alternatives(part)
+            alternatives.extend(part_alternatives)
+            exact = exact and part_exact
+        if any(not checks for checks in alternatives):
+            return [[]], False  # some part doesn't check types, so any types may pass
+        return alternatives, exact
+    return [[]], False
+
+
+def _implies(checks, other_checks):
+    """Return whether arguments passing the given type checks surely pass the other ones."""
+    return all(any(position == other_position and all(
+        any(_is_subclass(cls, other_cls) for other_cls in other_types) for cls in types)
+        for position, types in checks)
+        for other_position, other_types in other_checks)
+
+
+def _disjoint_checks(checks, other_checks):
+    """Return whether no arguments may pass both the given type checks and the other ones."""
+    return any(position == other_position and all(_disjoint_types(cls, other_cls)
+                                                  for cls in types for other_cls in other_types)
+               for position, types in checks for other_position, other_types in other_checks)
+
+
+def _resolved_type(cls):
+    return cls.resolve() if isinstance(cls, _LazyType) else cls
+
+
+def _is_subclass(cls, other_cls):
+    cls, other_cls = _resolved_type(cls), _resolved_type(other_cls)
+    return cls is not None and other_cls is not None and issubclass(cls, other_cls)
+
+
+_TPFLAGS_BASETYPE = 1 << 10  # of types which may be subclassed
+
+_pointer_size = struct.calcsize(str('P'))
+
+
+def _disjoint_types(cls, other_cls):
+    """Return whether no object may be an instance of both types."""
+    cls, other_cls = _resolved_type(cls), _resolved_type(other_cls)
+    if not isinstance(cls, type) or not isinstance(other_cls, type):
+        return False  # unresolved, or python 2 classic classes
+    if issubclass(cls, other_cls) or issubclass(other_cls, cls):
+        return False
+    if isinstance(cls, ABCMeta) or isinstance(other_cls, ABCMeta):
+        return False  # which may get virtual subclasses registered
+    if not cls.__flags__ & _TPFLAGS_BASETYPE or not other_cls.__flags__ & _TPFLAGS_BASETYPE:
+        return True
+    solid_base, other_solid_base = _solid_base(cls), _solid_base(other_cls)
+    return not issubclass(solid_base, other_solid_base) and not issubclass(other_solid_base, solid_base)
+
+
+def _solid_base(cls):
+    """Return the class whose instance layout a class has, like CPython does to find out which classes
+    may be derived from together: a class deriving from several must have one of their solid bases
+    derive from all others.
+    """
+    if cls.__base__ is None:
+        return cls
+    base = _solid_base(cls.__base__)
+    size = cls.__basicsize__
+    if cls.__itemsize__ or base.__itemsize__:
+        extends_layout = size != base.__basicsize__ or cls.__itemsize__ != base.__itemsize__
+    else:
+        # the slots of weak references and of the instance dict don't count
+        if cls.__weakrefoffset__ > 0 and not base.__weakrefoffset__ and cls.__weakrefoffset__ + _pointer_size == size:
+            size -= _pointer_size
+        if cls.__dictoffset__ > 0 and not base.__dictoffset__ and cls.__dictoffset__ + _pointer_size == size:
+            size -= _pointer_size
+        extends_layout = size != base.__basicsize__
+    return cls if extends_layout else base
+
+
+def _and_parts(predicate):
+    """Return the parts of the AND relation of a predicate, which may be None to mean no parts at all."""
+    if predicate is None:
+        return ()
+    if isinstance(predicate, _AllOf):
+        return predicate.predicates
+    return predicate,
+
+
+class _CodeBuilder(object):
+    """Builds a function taking the given parameters (see _Parameters), with the same defaults,
+    from the source of its body, which refers to other objects by names that don't clash with the arguments.
+    """
+
+    def __init__(self, parameters):
+        self._parameters = parameters
+        self.arg_names = parameters.names
+        self._prefix = '_'
+        while any(arg_name.startswith(self._prefix) for arg_name in self.arg_names):
+            self._prefix += '_'
+        self._namespace = {'__name__': __name__}
+        self._names = {}
+
+    @property
+    def values(self):
+        """The source of the tuple of the values of all arguments (see _FunctionInfo.bind)."""
+        return '({}{})'.format(', '.join(self.arg_names), ',' if len(self.arg_names) == 1 else '')
+
+    def ref(self, obj):
+        """Return the name the source refers to the object by."""
+        try:
+            return self._names[id(obj)]
+        except KeyError:
+            name = self._names[id(obj)] = str('{}{}'.format(self._prefix, len(self._names)))
+            self._namespace[name] = obj
+            return name
+
+    def local(self, name):
+        """Return a name for a local variable."""
+        return str(self._prefix + name)
+
+    def call(self, function_info):
+        """Return the source of a call to a _FunctionInfo, passing the arguments it takes."""
+        return '{}({})'.format(self.ref(function_info._function), self.arguments(function_info.parameters))
+
+    def arguments(self, parameters):
+        """Return the source of the arguments passing the same named arguments to the given parameters."""
+        args = list(parameters.positional)
+        if parameters.varargs is not None:
+            args.append('*' + parameters.varargs)
+        args.extend('{0}={0}'.format(arg_name) for arg_name in parameters.keyword_only)
+        if parameters.varkw is not None:
+            args.append('**' + parameters.varkw)
+        return ', '.join(args)
+
+    def _signature(self):
+        parameters = self._parameters
+
+        def declare(arg_name):
+            if arg_name not in parameters.defaults:
+                return arg_name
+            return '{}={}'.format(arg_name, self.ref(parameters.defaults[arg_name]))
+
+        declarations = [declare(arg_name) for arg_name in parameters.positional]
+        if parameters.varargs is not None:
+            declarations.append('*' + parameters.varargs)
+        elif parameters.keyword_only:
+            declarations.append('*')
+        declarations.extend(declare(arg_name) for arg_name in parameters.keyword_only)
+        if parameters.varkw is not None:
+            declarations.append('**' + parameters.varkw)
+        return ', '.join(declarations)
+
+    def build(self, lines):
+        """Return the function whose body is made of the given lines."""
+        source = 'def dispatch({}):\n{}\n'.format(self._signature(), '\n'.join(
+            '    ' + line for lines_source in lines for line in lines_source.split('\n')))
+        exec(compile(source, '<generated by genericfuncs>', 'exec'), self._namespace)
+        return self._namespace['dispatch']
+
+
+class _LRUCache(object):
+    """A mapping holding its `maxsize` most recently used keys (or unbounded if it's None), counting lookups.
+    If given a `ttl`, keys are only held for that many seconds after being set.
+
+    Calls look up and set keys concurrently, which reorders the entries. Each change of a dict, or of the
+    OrderedDict implemented in C, is atomic, but the OrderedDict implemented in Python (on Python 2) may be
+    corrupted by concurrent changes, so bounded caches change it holding a lock there.
+    """
+
+    __slots__ = ('maxsize', 'ttl', 'hits', 'misses', '_entries', '_lock')
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock() if maxsize is not None and _ordered_dict_in_python else None
+        self.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, key):
+        lock = self._lock
+        if lock is not None:
+            lock.acquire()
+        try:
+            if self.maxsize is None:
+                value = self._entries[key]
+            else:
+                value = self._entries[key] = self._entries.pop(key)  # move to the end
+            if self.ttl is not None:
+                value, expiry = value  # see __setitem__()
+                if _clock() >= expiry:
+                    self._entries.pop(key, None)
+                    raise KeyError(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        finally:
+            if lock is not None:
+                lock.release()
+        self.hits += 1
+        return value
+
+    def clear(self):
+        """Remove all entries, and zero the counts of lookups."""
+        self.hits = self.misses = 0
+        self._entries = collections.OrderedDict() if self.maxsize is not None else {}
+
+    def discard(self, condition):
+        """Remove the entries whose values the given callable is True for. Only caches without a `ttl` support it."""
+        with self._lock or _no_lock():
+            for key, value in list(self._entries.items()):
+                if condition(value):
+                    self._entries.pop(key, None)
+
+    def __setitem__(self, key, value):
+        lock = self._lock
+        if lock is not None:
+            lock.acquire()
+        try:
+            self._entries[key] = value if self.ttl is None else (value, _clock() + self.ttl)
+            if self.maxsize is not None and len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        except KeyError:  # emptied concurrently
+            pass
+        finally:
+            if lock is not None:
+                lock.release()
+
+
+_ordered_dict_in_python = isinstance(collections.OrderedDict.__init__, (types.FunctionType, types.MethodType))
+
+
+@contextlib.contextmanager
+def _no_lock():
+    yield
+
+
+_DEFAULT_MEMO_SIZE = 128
+
+
+def _check_memoize_options(memoize, memoize_ttl):
+    if not isinstance(memoize, bool) and not (isinstance(memoize, int) and memoize > 0):
+        raise ValueError('memoize must be True, False or a positive number of results.')
+    if memoize_ttl is not None and memoize_ttl <= 0:
+        raise ValueError('memoize_ttl must be a positive number of seconds.')
+
+
+def _make_memo(function, memoize, memoize_ttl):
+    """Return the _LRUCache memoizing the results of a function, given the (checked) memoize options."""
+    if _iscoroutinefunction(function):
+        raise ValueError('The results of coroutine functions can\'t be memoized.')
+    return _LRUCache(_DEFAULT_MEMO_SIZE if memoize is True else memoize, ttl=memoize_ttl)
+
+
+class _Memoized(object):
+    """Invokes a function, memoizing its results in an _LRUCache by its arguments and their classes
+    (as equal values of different classes may have different results).
+    """
+
+    __slots__ = ('function', 'cache')
+
+    def __init__(self, function, cache):
+        self.function = function
+        self.cache = cache
 
     def __call__(self, *args, **kwargs):
-        partial_args = self._find_arg_values(args)
-        partial_kwargs = {k: v for k, v in kwargs.iteritems() if k in self.args}
-        return self._function(*partial_args, **partial_kwargs)
-
-    def _find_arg_values(self, input_arg_values):
-        unnecessary_arg_names = set(self._base_function.args) - set(self.args)
-        unnecessary_arg_indexes = [self._base_function.args.index(arg_name) for arg_name in unnecessary_arg_names]
-        return [arg_value for index, arg_value in enumerate(input_arg_values)
-                if index not in unnecessary_arg_indexes]
+        key = args + tuple([arg.__class__ for arg in args])
+        if kwargs:
+            keywords = sorted(kwargs.items())
+            key += (_KEYWORDS_MARK,) + tuple(keywords) + tuple([value.__class__ for _, value in keywords])
+        try:
+            return self.cache[key]
+        except KeyError:
+            pass
+        except TypeError:  # unhashable arguments
+            return self.function(*args, **kwargs)
+        result = self.function(*args, **kwargs)
+        self.cache[key] = result
+        return result
+
+
+_KEYWORDS_MARK = object()  # separates positional from keyword arguments in the keys of _Memoized
+
+
+_iscoroutinefunction = getattr(inspect, 'iscoroutinefunction', lambda function: False)
+_isawaitable = getattr(inspect, 'isawaitable', lambda obj: False)
+
+
+def _isfuture(obj):
+    return asyncio is not None and isinstance(obj, asyncio.Future)
+
+
+def _new_future():
+    """Return a future of the running event loop, which must be running (unless Python predates asyncio.run())."""
+    get_running_loop = getattr(asyncio, 'get_running_loop', None)
+    loop = get_running_loop() if get_running_loop is not None else asyncio.get_event_loop()
+    return loop.create_future()
+
+
+def _then(future, callback):
+    """Return a future of the outcome of calling the callback with the result of the given future.
+    The callback may return a future as well, whose result is then taken.
+    Exceptions and cancellation are propagated from the given future, and cancellation back to it.
+    """
+    outcome = _new_future()
+
+    def on_done(future):
+        if outcome.done():
+            return
+        if future.cancelled() or future.exception() is not None:
+            _copy_future(future, outcome)
+            return
+
+        try:
+            result = callback(future.result())
+        except Exception as e:
+            outcome.set_exception(e)
+            return
+
+        if _isfuture(result):
+            result.add_done_callback(lambda result: _copy_future(result, outcome))
+            outcome.add_done_callback(lambda _: result.cancel() if outcome.cancelled() else None)
+        else:
+            outcome.set_result(result)
+
+    future.add_done_callback(on_done)
+    outcome.add_done_callback(lambda _: future.cancel() if outcome.cancelled() else None)
+    return outcome
+
+
+def _copy_future(source, destination):
+    if destination.done():
+        return
+    if source.cancelled():
+        destination.cancel()
+    elif source.exception() is not None:
+        destination.set_exception(source.exception())
+    else:
+        destination.set_result(source.result())
+
+
+class _AsyncDispatch(object):
+    """Chooses an implementation and invokes it while awaiting predicates concurrently (see generic.call_async()).
+    The outcome is set to the `future` attribute.
+    """
+
+    def __init__(self, candidates, default, values):
+        """
+        :param candidates: (predicate, implementation) pairs in order of registration,
+                           a None predicate meaning the implementation is chosen unconditionally.
+        :param default: chosen when no predicate is True.
+        """
+        self.future = _new_future()
+        self.future.add_done_callback(self._cancel_pending)
+        self._decided = False
+        self._values = values
+        self._default = default
+        self._outcomes = []  # the outcomes of the predicates evaluated so far, each either a boolean or a future
+
+        for predicate, function in candidates:
+            try:
+                outcome = True if predicate is None else predicate.test_async(values)
+            except Exception as e:
+                # only raised if the predicates before it are False, so it's treated like a False outcome awaited
+                outcome = _new_future()
+                outcome.set_exception(e)
+
+            if _isfuture(outcome):
+                outcome.add_done_callback(self._decide)
+            else:
+                outcome = bool(outcome)
+            self._outcomes.append((outcome, function))
+
+            if outcome is True or (_isfuture(outcome) and outcome.done() and outcome.exception() is not None):
+                break  # a regular call wouldn't evaluate the predicates after this one
+
+        self._decide()
+
+    def _decide(self, _=None):
+        if self._decided or self.future.done():
+            return
+
+        for outcome, function in self._outcomes:
+            if _isfuture(outcome):
+                if not outcome.done():
+                    return  # the outcome of a predicate before is yet unknown
+                if outcome.cancelled():
+                    self.future.cancel()
+                    return
+                if outcome.exception() is not None:
+                    self.future.set_exception(outcome.exception())
+                    return
+                outcome = outcome.result()
+            if outcome:
+                self._invoke(function)
+                return
+
+        self._invoke(self._default)
+
+    def _invoke(self, function):
+        self._decided = True
+        self._cancel_pending()
+        try:
+            result = function(self._values)
+        except Exception as e:
+            self.future.set_exception(e)
+            return
+
+        if _isawaitable(result):
+            result = asyncio.ensure_future(result)
+            result.add_done_callback(lambda result: _copy_future(result, self.future))
+            self.future.add_done_callback(lambda _: result.cancel() if self.future.cancelled() else None)
+        else:
+            self.future.set_result(result)
+
+    def _cancel_pending(self, future=None):
+        for outcome, function in self._outcomes:
+            if not _isfuture(outcome):
+                continue
+            if not outcome.done():
+                outcome.cancel()
+            elif not outcome.cancelled():
+                outcome.exception()  # the outcome is no longer needed, so don't have asyncio log its exception
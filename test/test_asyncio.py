@@ -0,0 +1,156 @@
+from __future__ import unicode_literals
+from __future__ import division
+
+import pytest
+import genericfuncs
+
+asyncio = pytest.importorskip('asyncio')
+
+# coroutine functions are defined via exec(), to keep this module importable on Python 2
+exec('''
+async def sleep_then(delay, result, events=None, name=None):
+    try:
+        await asyncio.sleep(delay)
+    except asyncio.CancelledError:
+        if events is not None:
+            events.append(name + ' cancelled')
+        raise
+    if events is not None:
+        events.append(name)
+    return result
+
+
+async def is_beta(user):
+    await asyncio.sleep(0)
+    return user == 'beta'
+
+
+async def await_made(make_awaitable):
+    result = await make_awaitable()
+    await asyncio.sleep(0)  # let the predicates that were cancelled handle it
+    return result
+''')
+
+
+def run(make_awaitable):
+    """Return the result of the awaitable made by the given callable, made and awaited in a new event loop."""
+    if hasattr(asyncio, 'run'):
+        return asyncio.run(await_made(make_awaitable))
+    loop = asyncio.new_event_loop()  # python < 3.7
+    asyncio.set_event_loop(loop)
+    try:
+        return loop.run_until_complete(await_made(make_awaitable))
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def test_call_async_awaits_predicates_and_implementations():
+    @genericfuncs.generic
+    def genfunc(user):
+        return 'default'
+
+    @genfunc.when(is_beta)
+    def _(user):
+        return sleep_then(0, 'beta')
+
+    @genfunc.when(lambda user: user == 'admin')
+    def _(user):
+        return 'admin'
+
+    assert run(lambda: genfunc.call_async('beta')) == 'beta'
+    assert run(lambda: genfunc.call_async('admin')) == 'admin'
+    assert run(lambda: genfunc.call_async(user='other')) == 'default'
+
+    with pytest.raises(TypeError):
+        genfunc('beta')  # a coroutine function can't be evaluated regularly
+
+
+def test_call_async_evaluates_predicates_concurrently_in_order():
+    events = []
+
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(lambda a: sleep_then(0.05, a == 1, events, 'first'))
+    def _(a):
+        return 'first'
+
+    @genfunc.when(lambda a: sleep_then(0.01, True, events, 'second'))
+    def _(a):
+        return 'second'
+
+    @genfunc.when(lambda a: sleep_then(1, True, events, 'third'))
+    def _(a):
+        return 'third'
+
+    assert run(lambda: genfunc.call_async(1)) == 'first'
+    assert events == ['second', 'first', 'third cancelled']
+
+    del events[:]
+    assert run(lambda: genfunc.call_async(2)) == 'second'  # doesn't wait for the third predicate
+    assert events == ['second', 'first', 'third cancelled']
+
+
+def test_call_async_stops_at_predicates_decided_without_awaiting():
+    events = []
+
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(lambda a: sleep_then(0.01, a == 1, events, 'awaited'))
+    def _(a):
+        return 'awaited'
+
+    @genfunc.when([int, lambda a: a > 1])
+    def _(a):
+        return 'int'
+
+    @genfunc.when(lambda a: events.append('third'))
+    def _(a):
+        return 'never'
+
+    @genfunc.when(lambda a: a.bad_attribute)
+    def _(a):
+        return 'never'
+
+    assert run(lambda: genfunc.call_async(1)) == 'awaited'
+    assert events == ['third', 'awaited']  # evaluated while the first predicate is awaited
+    del events[:]
+    assert run(lambda: genfunc.call_async(2)) == 'int'
+    assert events == ['awaited']
+
+    with pytest.raises(AttributeError):
+        run(lambda: genfunc.call_async(2.5))  # the type check fails, so the next predicates are evaluated regularly
+
+
+def test_call_async_with_compound_predicates():
+    @genericfuncs.generic
+    def genfunc(user, a):
+        return 'default'
+
+    @genfunc.when([{'a': int}, is_beta, lambda a: a > 0])
+    def _(a):
+        return 'beta and positive'
+
+    @genfunc.when([lambda a: sleep_then(0, a == 0), lambda a: a == 0], type={'a': [int, float]})
+    def _(a):
+        return 'zero'
+
+    assert run(lambda: genfunc.call_async('beta', 1)) == 'beta and positive'
+    assert run(lambda: genfunc.call_async('beta', 0)) == 'zero'
+    assert run(lambda: genfunc.call_async('other', 1)) == 'default'
+    assert run(lambda: genfunc.call_async('other', 0.0)) == 'zero'
+    assert run(lambda: genfunc.call_async('other', 'abc')) == 'default'
+
+
+@pytest.mark.skipif(not hasattr(asyncio, 'get_running_loop'), reason='python < 3.7 creates an event loop')
+def test_call_async_requires_a_running_loop():
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    with pytest.raises(RuntimeError):
+        genfunc.call_async(1)
@@ -1,9 +1,18 @@
 from __future__ import unicode_literals
 from __future__ import division
 
+import sys
+import threading
+import time
+
 import pytest
 import genericfuncs
 
+try:
+    string_types = basestring
+except NameError:  # python 3
+    string_types = str
+
 
 def test_genfunc_with_only_default_impl():
     @genericfuncs.generic
@@ -22,9 +31,9 @@ def test_correct_genfunc_impl_invoked():
     def when_a_largerthan_b_largerthan_c(a, b, c):
         return 'a > b > c'
 
-    @genfunc.when(long)
-    def when_all_params_long(a, b, c):
-        return 'all are long'
+    @genfunc.when(float)
+    def when_all_params_float(a, b, c):
+        return 'all are float'
 
     @genfunc.when(lambda a, b, c: a < b < c)
     def when_a_lessthan_b_lessthan_c(a, b, c):
@@ -48,7 +57,7 @@ def test_correct_genfunc_impl_invoked():
 
     assert genfunc(4, 4, 4) == 'default impl'
     assert genfunc(5, 3, 2) == 'a > b > c'
-    assert genfunc(10L, 20L, 1L) == 'all are long'
+    assert genfunc(10.0, 20.0, 1.0) == 'all are float'
     assert genfunc(1, 10, 30) == 'a < b < c'
     assert genfunc(2, 10, 0) == 'one or more is 0'
     assert genfunc(8, 8, 8) == 'a == b == c == 8'
@@ -105,6 +114,34 @@ def test_parameter_injection():
     assert "Argument specified in implementation doesn\'t exist in base function." in str(exc_info)
 
 
+def test_varargs_take_leftover_arguments():
+    @genericfuncs.generic
+    def genfunc(a, b, c=3):
+        return 'default'
+
+    @genfunc.when(lambda a, *args: a == 1)
+    def _(*args):
+        return args
+
+    @genfunc.when(lambda **kwargs: kwargs['b'] == 2)
+    def _(b, **kwargs):
+        return sorted(kwargs.items())
+
+    @genfunc.when({'c': lambda *args: args == (4,)})  # only sees the argument it's given for
+    def _():
+        return 'c is 4'
+
+    @genfunc.when(lambda *args: True)
+    def _(a, *rest):
+        return rest
+
+    assert genfunc(1, 0) == (1, 0, 3)
+    assert genfunc(0, 2) == [('a', 0), ('c', 3)]
+    assert genfunc(0, 0, 4) == 'c is 4'
+    assert genfunc(5, 6) == (6, 3)
+    assert list(genfunc.imap([(1, 0), (5, 6, 7)])) == [(1, 0, 3), (6, 7)]
+
+
 def test_multiple_predicates():
     @genericfuncs.generic
     def genfunc(a, b, c):
@@ -122,7 +159,7 @@ def test_multiple_predicates():
     def _(c):
         return locals()
 
-    @genfunc.when([lambda b: b == 'paramb', lambda a, c: a == 'parama' and c == 'paramc', basestring])
+    @genfunc.when([lambda b: b == 'paramb', lambda a, c: a == 'parama' and c == 'paramc', string_types])
     def _(c):
         return locals()
 
@@ -152,17 +189,17 @@ def test_genfunc_call_with_keyword_arguments():
     assert genfunc(1, b=1, c=1) == 'default'
     with pytest.raises(TypeError) as exc_info:
         genfunc(1, 1, 1, c=1)
-    assert 'got multiple values for keyword argument' in str(exc_info)
+    assert 'got multiple values for' in str(exc_info)
     with pytest.raises(TypeError) as exc_info:
         genfunc(1, 1, 1, b=1, c=1)
-    assert 'got multiple values for keyword argument' in str(exc_info)
+    assert 'got multiple values for' in str(exc_info)
 
     assert genfunc(3, 2, 1) == [3, 2, 1]
     assert genfunc(a=3, b=2, c=1) == [3, 2, 1]
     assert genfunc(3, 2, c=1) == [3, 2, 1]
     with pytest.raises(TypeError) as exc_info:
         genfunc(3, 2, 1, b=2, c=1)
-    assert 'got multiple values for keyword argument' in str(exc_info)
+    assert 'got multiple values for' in str(exc_info)
 
 
 def test_invalid_genfunc_calls_raise_error():
@@ -221,7 +258,7 @@ def test_predicates_with_type_precondition_different_types():
     def _(a):
         return 'a.startswith(\'bar\')'
 
-    @genfunc.when(lambda a: a.endswith('foo'), type=basestring)
+    @genfunc.when(lambda a: a.endswith('foo'), type=string_types)
     def _(a):
         return 'a.endswith(\'foo\')'
 
@@ -236,7 +273,7 @@ def test_predicates_with_type_precondition_different_types():
     with pytest.raises(AttributeError):
         genfunc(5)   # an AttributeError should be raised inside the second predicate (`a.startswith('bar')`),
                      # because int objects don't have the `startswith` methodd.
-                     # the predicate is allowed to run, because `type=basestring` wasn't specified.
+                     # the predicate is allowed to run, because `type=string_types` wasn't specified.
 
     assert genfunc('abc') == 'default'
 
@@ -250,7 +287,7 @@ def test_type_precondition_as_dict():
     def _(a):
         return 'a > b'
 
-    @genfunc.when(lambda b: b.endswith('bar'), type={'b': basestring})
+    @genfunc.when(lambda b: b.endswith('bar'), type={'b': string_types})
     def _(a):
         return 'b.endswith(\'bar\')'
 
@@ -311,14 +348,14 @@ def test_dict_as_predicate():
 
     @genfunc.when({
         'a': lambda a: a.startswith('foo')
-    }, type=basestring)
+    }, type=string_types)
     def _(a, b):
         return 'a starts with foo and all args are strings'
 
     @genfunc.when({
         'a': lambda a: a.startswith('foo')
     }, type={
-        'a': basestring,
+        'a': string_types,
         'b': float
     })
     def _(a, b):
@@ -327,7 +364,7 @@ def test_dict_as_predicate():
     # not currently supported
     # @genfunc.when({
     #     'a': lambda a: a.startswith('foo')
-    # }, type=[basestring, list])
+    # }, type=[string_types, list])
     # def _(a, b):
     #     return 'a starts with foo and all are either strings or lists'
 
@@ -344,3 +381,1332 @@ def test_dict_as_predicate():
     assert genfunc(a=[], b=[]) == 'default'
 
 
+def test_parameter_injection_by_name_regardless_of_order():
+    @genericfuncs.generic
+    def genfunc(a, b, c):
+        return 'default'
+
+    @genfunc.when(lambda c, a: c > a)
+    def _(c, b):
+        return [c, b]
+
+    assert genfunc(1, 2, 3) == [3, 2]
+    assert genfunc(1, 2, c=3) == [3, 2]
+    assert genfunc(a=1, b=2, c=3) == [3, 2]
+    assert genfunc(3, 2, 1) == 'default'
+
+
+def test_type_dispatch_follows_mro():
+    class Base(object):
+        pass
+
+    class Derived(Base):
+        pass
+
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    @genfunc.when({'a': Derived, 'b': int})
+    def _(a, b):
+        return 'derived and int'
+
+    @genfunc.when(lambda b: b > 10, type={'a': Base, 'b': [int, float]})
+    def _(a, b):
+        return 'base and b > 10'
+
+    @genfunc.when(Base)
+    def _(a, b):
+        return 'all base'
+
+    assert genfunc(Derived(), 5) == 'derived and int'
+    assert genfunc(Base(), 5) == 'default'
+    assert genfunc(Base(), 15) == 'base and b > 10'
+    assert genfunc(Derived(), 15.5) == 'base and b > 10'
+    assert genfunc(Base(), Derived()) == 'all base'
+    assert genfunc(Derived(), 'abc') == 'default'
+
+
+def test_type_dispatch_updated_upon_registration():
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(lambda a: a > 5, type=int)
+    def _(a):
+        return 'a > 5'
+
+    assert genfunc(1) == 'default'
+    assert genfunc(1.5) == 'default'
+
+    @genfunc.when([float, int])
+    def _(a):
+        return 'never'
+
+    @genfunc.when([lambda a: a < 5], type=[int, float])
+    def _(a):
+        return 'a < 5'
+
+    assert genfunc(1) == 'a < 5'
+    assert genfunc(1.5) == 'a < 5'
+    assert genfunc(10) == 'a > 5'
+    assert genfunc(5) == 'default'
+
+
+def test_type_dispatch_with_abstract_base_classes():
+    import abc
+
+    Abstract = abc.ABCMeta(str('Abstract'), (object,), {})
+
+    class Virtual(object):
+        pass
+
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(Abstract)
+    def _(a):
+        return 'abstract'
+
+    assert genfunc(Virtual()) == 'default'
+    Abstract.register(Virtual)
+    assert genfunc(Virtual()) == 'abstract'
+
+
+def test_dict_predicate_argument_validation():
+    @genericfuncs.generic
+    def genfunc(a, b, c):
+        return 'default'
+
+    @genfunc.when({'b': string_types, 'c': lambda c: c > 0})
+    def _(a):
+        return 'b is a string and c > 0'
+
+    @genfunc.when({'a': [int, {'a': lambda a: a > 0}], 'c': [float]})
+    def _(a):
+        return 'a is a positive int and c is a float'
+
+    assert genfunc(None, 'abc', 1) == 'b is a string and c > 0'
+    assert genfunc(None, b='abc', c=1) == 'b is a string and c > 0'
+    assert genfunc(None, 'abc', 0) == 'default'
+    assert genfunc(1, None, 1.5) == 'a is a positive int and c is a float'
+    assert genfunc(0, None, 1.5) == 'default'
+    assert genfunc(1, None, 1) == 'default'
+
+    with pytest.raises(ValueError):
+        @genfunc.when({'d': int})
+        def _(a):
+            return 'never'
+
+    with pytest.raises(ValueError):
+        # the predicate of an argument may only take that argument
+        @genfunc.when({'a': lambda b: b > 0})
+        def _(a):
+            return 'never'
+
+
+def test_mixed_predicates_chosen_in_order():
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    @genfunc.when([{'a': int}, lambda a: a > 10])
+    def _(a):
+        return 'int a > 10'
+
+    @genfunc.when({'a': int, 'b': lambda b: b == 'x'})
+    def _(a):
+        return 'int a and b == x'
+
+    @genfunc.when(lambda a, b: a == b)
+    def _(a):
+        return 'a == b'
+
+    @genfunc.when(lambda b: b.startswith('y'), type={'b': string_types})
+    def _(a):
+        return 'b starts with y'
+
+    @genfunc.when(int)
+    def _(a):
+        return 'all int'
+
+    assert genfunc(20, 'x') == 'int a > 10'
+    assert genfunc(5, 'x') == 'int a and b == x'
+    assert genfunc(5, 5) == 'a == b'
+    assert genfunc(5, 'yes') == 'b starts with y'
+    assert genfunc(5, 6) == 'all int'
+    assert genfunc(5.5, 6) == 'default'
+    assert genfunc(5.5, 5.5) == 'a == b'
+    assert genfunc(a=20, b='x') == 'int a > 10'
+
+
+def test_shared_predicates_skipped_by_types():
+    calls = []
+
+    def is_admin(user):
+        calls.append(user)
+        return user == 'admin'
+
+    @genericfuncs.generic
+    def genfunc(user, resource):
+        return 'default'
+
+    for resource_type in (int, float, list, dict, set):
+        genfunc.when([is_admin, {'resource': resource_type}])(lambda resource: 'admin')
+
+    genfunc.when(lambda resource: resource == 'public')(lambda resource: 'public')
+
+    assert genfunc('admin', {}) == 'admin'
+    assert genfunc('guest', 'public') == 'public'  # no registration of is_admin may match, so it isn't called
+    assert genfunc('guest', []) == 'default'
+    assert calls == ['admin', 'guest']
+
+    genfunc.when(is_admin)(lambda: 'any admin')
+    del calls[:]
+    assert genfunc('guest', 1.5) == 'default'
+    assert genfunc('admin', 'private') == 'any admin'
+    assert calls == ['guest', 'admin']
+
+
+def test_pure_predicates_dispatch_decisions_cached():
+    calls = []
+
+    def is_magic(a):
+        calls.append(a)
+        return a == 'magic'
+
+    @genericfuncs.generic(pure=True, cache_size=2)
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(is_magic)
+    def _(a):
+        return 'magic'
+
+    assert genfunc('magic') == 'magic'
+    assert genfunc('magic') == 'magic'
+    assert genfunc('other') == 'default'
+    assert genfunc('other') == 'default'
+    assert calls == ['magic', 'other']
+    assert genfunc.cache_info() == (2, 2, 2, 2)
+
+    assert genfunc('third') == 'default'
+    assert genfunc('magic') == 'magic'  # evicted by 'third'
+    assert calls == ['magic', 'other', 'third', 'magic']
+
+    assert genfunc([]) == 'default'  # unhashable arguments aren't cached
+    assert genfunc([]) == 'default'
+    assert calls[-2:] == [[], []]
+
+    @genfunc.when(int)
+    def _(a):
+        return 'int'
+
+    # registration invalidates the cache
+    assert genfunc.cache_info().currsize == 0
+    assert genfunc(1) == 'int'
+    assert genfunc(1.0) == 'default'  # equal to 1, but of a different class
+    assert genfunc(True) == 'int'
+
+    genfunc.cache_clear()
+    assert genfunc.cache_info() == (0, 0, 2, 0)
+
+
+def test_impure_predicates_dispatch_decisions_not_cached():
+    calls = []
+
+    def is_magic(a):
+        calls.append(a)
+        return a == 'magic'
+
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    @genfunc.when({'a': is_magic}, pure=True)
+    def _(a):
+        return 'magic'
+
+    @genfunc.when(lambda b: b == 'now')
+    def _(a):
+        return 'now'
+
+    @genfunc.when({'b': lambda b: is_magic(b)}, pure=True)
+    def _(b):
+        return 'magic b'
+
+    for _ in range(2):
+        assert genfunc('magic', 'now') == 'magic'
+        assert genfunc('other', 'now') == 'now'
+        assert genfunc('other', 'magic') == 'magic b'
+
+    # only the choice of the first implementation didn't depend on the impure predicate
+    assert calls == ['magic', 'other', 'other', 'magic', 'other', 'other', 'magic']
+    assert genfunc.cache_info() == (1, 5, 128, 1)
+
+
+def test_map_batch():
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    @genfunc.when(lambda a: [value > 100 for value in a], vectorized=True)
+    def _(b):
+        return ['large a, b = {}'.format(value) for value in b]
+
+    @genfunc.when(lambda b: b == 'x')
+    def _(a):
+        return 'b == x, a = {}'.format(a)
+
+    @genfunc.when(lambda a, b: [value == 0 for value in a], vectorized=True)
+    def _(a):
+        return ['zero a' for _ in a]
+
+    assert genfunc.map_batch(a=[1, 200, 0, 300, 2], b=['x', 'y', 'z', 'x', 'y']) == \
+        ['b == x, a = 1', 'large a, b = y', 'zero a', 'large a, b = x', 'default']
+    assert genfunc.map_batch(b=['x', 'y'], a=[0, 0]) == ['b == x, a = 0', 'zero a']
+    assert genfunc.map_batch(a=[], b=[]) == []
+
+    with pytest.raises(ValueError):
+        genfunc.map_batch(a=[1, 2], b=['x'])
+    with pytest.raises(TypeError):
+        genfunc.map_batch(a=[1, 2])
+    with pytest.raises(TypeError):
+        @genfunc.when(int, vectorized=True)
+        def _(a):
+            return 'never'
+
+    @genericfuncs.generic
+    def with_default(a, b=2):
+        return a + b
+
+    with_default.when(lambda a: [value > 1 for value in a], vectorized=True)(
+        lambda a, b: [value * factor for value, factor in zip(a, b)])
+    assert with_default.map_batch(a=[1, 3]) == [3, 6]  # b defaults to 2 in every row
+    assert with_default.map_batch(a=[1, 3], b=[10, 10]) == [11, 30]
+    with pytest.raises(TypeError) as exc_info:
+        with_default.map_batch(b=[1])
+    assert "'a'" in str(exc_info.value)
+
+
+def test_map_batch_over_numpy_arrays():
+    numpy = pytest.importorskip('numpy')
+
+    @genericfuncs.generic
+    def price(quantity, unit_price):
+        return quantity * unit_price
+
+    @price.when(lambda quantity: quantity > 100, vectorized=True)
+    def _(quantity, unit_price):
+        return quantity * unit_price * 0.5
+
+    assert price.map_batch(quantity=numpy.array([1, 200, 2]), unit_price=numpy.array([10., 10., 5.])) == \
+        [10., 1000., 10.]
+    assert price(200, 10.) == 1000.
+
+
+def test_imap():
+    import itertools
+
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    @genfunc.when(lambda a, b: a > b)
+    def _(a):
+        return 'a > b'
+
+    @genfunc.when(int)
+    def _(b):
+        return b
+
+    assert list(genfunc.imap([(2, 1), (1, 2), (1.0, 2.0), [3, 4]], chunk_size=3)) == ['a > b', 2, 'default', 4]
+    unordered_results = genfunc.imap([(2, 1), (1, 2), (1.0, 2.0), (3, 4)], ordered=False)
+    assert sorted(unordered_results, key=str) == [2, 4, 'a > b', 'default']
+    assert list(genfunc.imap_kwargs([{'a': 2, 'b': 1}, {'b': 2, 'a': 1}])) == ['a > b', 2]
+
+    # the iterable is consumed lazily, chunk by chunk
+    results = genfunc.imap(((n, n) for n in itertools.count()), chunk_size=10)
+    assert list(itertools.islice(results, 15)) == list(range(15))
+
+    with pytest.raises(ValueError):
+        list(genfunc.imap([(1, 2, 3)]))
+    with pytest.raises(ValueError):
+        list(genfunc.imap_kwargs([{'a': 1, 'c': 2}]))
+    with pytest.raises(TypeError):
+        list(genfunc.imap_kwargs([{'a': 1}]))
+    with pytest.raises(ValueError):
+        genfunc.imap([], chunk_size=0)
+
+
+def test_dispatch_stats():
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    def is_positive(a):
+        return a > 0
+
+    @genfunc.when([is_positive, {'b': int}])
+    def when_positive_int(a):
+        return 'positive int'
+
+    @genfunc.when(float)
+    def when_floats(a):
+        return 'floats'
+
+    @genfunc.when([is_positive, lambda b: b == 'abc'])
+    def when_positive_string(a):
+        return 'positive string'
+
+    with pytest.raises(ValueError):
+        genfunc.stats()
+
+    genfunc(1, 1)
+    genfunc.enable_stats()
+    assert genfunc(1, 1) == 'positive int'
+    assert genfunc(1.5, 1.5) == 'floats'
+    assert genfunc(1, 'abc') == 'positive string'
+    assert genfunc(-1, 'abc') == 'default'
+    assert genfunc(-1, 1) == 'default'
+
+    @genfunc.when(lambda b: b is None)
+    def when_b_is_none(a):
+        return 'b is None'
+
+    assert genfunc(-1, None) == 'b is None'
+
+    stats = genfunc.stats()
+    assert [registration.implementation for registration in stats.registrations] == \
+        [when_positive_int, when_floats, when_positive_string, when_b_is_none]
+    assert [registration.matches for registration in stats.registrations] == [1, 1, 1, 1]
+    # the float registration is decided by the classes of the arguments alone
+    assert [registration.evaluations for registration in stats.registrations] == [2, 0, 4, 1]
+    assert stats.default_calls == 2
+    assert all(registration.predicate_time >= 0 and registration.implementation_time >= 0
+               for registration in stats.registrations)
+
+    genfunc.disable_stats()
+    genfunc(1, 1)
+    assert genfunc.stats() == stats
+
+    genfunc.enable_stats()
+    genfunc.reset_stats()
+    genfunc(1, 1)
+    assert [registration.matches for registration in genfunc.stats().registrations] == [1, 0, 0, 0]
+
+
+def test_exclusive_groups_reordered_by_matches():
+    # too few evaluations are timed for their cost to be taken into account, so groups are ordered by matches alone
+    evaluated = []
+
+    def equals(name):
+        def predicate(a):
+            evaluated.append(name)
+            return a == name
+        return predicate
+
+    @genericfuncs.generic(reorder_interval=10)
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(lambda a: a == 'first')
+    def _(a):
+        return 'not grouped'
+
+    for name in ('x', 'y', 'z'):
+        genfunc.when(equals(name), group='names')(lambda a: a)
+
+    @genfunc.when(lambda a: a == 'x')
+    def _(a):
+        return 'never'
+
+    @genfunc.when(equals('w'), group='names')  # evaluated along with the rest of its group
+    def _(a):
+        return 'w'
+
+    assert genfunc('w') == 'w'
+    assert evaluated == ['x', 'y', 'z', 'w']
+
+    for _ in range(8):
+        assert genfunc('z') == 'z'
+    assert genfunc('y') == 'y'  # the 10th call matching the group reorders it
+
+    del evaluated[:]
+    assert genfunc('x') == 'x'
+    assert evaluated[0] == 'z'  # matched most often
+    assert evaluated[-1] == 'x'  # never matched
+    assert sorted(evaluated) == ['w', 'x', 'y', 'z']
+    assert genfunc('first') == 'not grouped'
+    assert genfunc('other') == 'default'
+
+
+def test_memory_footprint():
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    def equals(value):
+        return lambda b: b == value
+
+    empty = genfunc.memory_footprint()
+    assert empty.registrations == 0
+    assert empty.predicates == 0
+
+    for value in range(10):
+        genfunc.when({'a': int, 'b': equals(value)})(lambda b: b)
+    assert genfunc(1, 2) == 2
+
+    footprint = genfunc.memory_footprint()
+    assert footprint.registrations == 10
+    assert footprint.predicates > 0
+    assert footprint.implementations > empty.implementations
+    assert footprint.total == (footprint.predicates + footprint.implementations + footprint.dispatch_index +
+                               footprint.decision_cache + footprint.memoized_results + footprint.statistics)
+
+    # equal type checks are held once
+    for value in range(10, 20):
+        genfunc.when({'a': int, 'b': equals(value)})(lambda b: b)
+    per_registration = (genfunc.memory_footprint().predicates - footprint.predicates) / 10
+    assert per_registration < footprint.predicates / 10
+
+    # functions taking the same arguments share what's derived from their parameters,
+    # so a registration holds little more than the objects wrapping its predicate and implementation
+    footprint = genfunc.memory_footprint()
+    for value in range(100):
+        genfunc.when(equals(value))(lambda b: b)
+    assert genfunc(1, 2) == 2
+    grown = genfunc.memory_footprint()
+    assert (grown.predicates + grown.implementations - footprint.predicates - footprint.implementations) / 100 < 600
+
+
+def test_freeze():
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    genfunc.when(int)(lambda a: 'int')
+    assert genfunc(1) == 'int'
+    dispatch_index = genfunc.memory_footprint().dispatch_index
+    genfunc.freeze()
+
+    with pytest.raises(ValueError):
+        genfunc.when(str)
+    assert genfunc.memory_footprint().dispatch_index == dispatch_index  # what was generated so far is kept
+    assert genfunc(1) == 'int'
+    assert genfunc('a') == 'default'
+
+
+def test_registration_while_called_from_threads():
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    def equals(value):
+        return lambda a: a == value
+
+    errors = []
+    done = threading.Event()
+
+    def call():
+        try:
+            while not done.is_set():
+                for value in range(50):
+                    assert genfunc(value, 'x') in ('default', value)
+                    assert genfunc(b='x', a=(value,)) in ('default', 'tuple')
+        except Exception as e:
+            errors.append(e)
+
+    callers = [threading.Thread(target=call) for _ in range(4)]
+    for thread in callers:
+        thread.start()
+    try:
+        for value in range(50):
+            genfunc.when(equals(value))(lambda a: a)
+            genfunc.when({'a': tuple} if value == 25 else equals(-value - 1))(lambda: 'tuple')
+    finally:
+        done.set()
+        for thread in callers:
+            thread.join()
+
+    assert not errors
+    assert [genfunc(value, 'x') for value in range(50)] == list(range(50))
+    assert genfunc((7,), 'x') == 'tuple'
+
+
+def test_caches_shared_by_threads():
+    @genericfuncs.generic(pure=True, cache_size=8, memoize=4)
+    def genfunc(a):
+        return a
+
+    genfunc.when(lambda a: a % 3 == 0)(lambda a: 'divisible')
+
+    errors = []
+
+    def call():
+        try:
+            for _ in range(200):
+                for value in range(20):
+                    assert genfunc(value) == ('divisible' if value % 3 == 0 else value)
+        except Exception as e:
+            errors.append(e)
+
+    callers = [threading.Thread(target=call) for _ in range(4)]
+    for thread in callers:
+        thread.start()
+    for thread in callers:
+        thread.join()
+
+    assert not errors
+    assert genfunc.cache_info().currsize <= 8
+    assert all(info.currsize <= 4 for info in genfunc.memo_info())
+
+
+def test_group_registration_while_called_from_threads():
+    @genericfuncs.generic(reorder_interval=1)
+    def genfunc(a):
+        return 'default'
+
+    def equals(value):
+        return lambda a: a == value
+
+    for value in range(100):  # so decaying their counters takes long enough for registration to interleave
+        genfunc.when(equals(value), group='values')(lambda a: a)
+
+    errors = []
+    done = threading.Event()
+
+    def call():
+        try:
+            while not done.is_set():
+                for value in range(10):
+                    assert genfunc(value) == value
+        except Exception as e:
+            errors.append(e)
+
+    switch_interval = sys.getswitchinterval() if hasattr(sys, 'getswitchinterval') else None
+    if switch_interval is not None:
+        sys.setswitchinterval(1e-5)  # switch threads often, so they interleave anywhere
+    callers = [threading.Thread(target=call) for _ in range(2)]
+    for thread in callers:
+        thread.start()
+    try:
+        for value in range(100, 300):
+            def implementation(a):
+                return 'never'
+            genfunc.when(equals(-value), group='values')(implementation)
+            time.sleep(0.0005)  # so calls reorder the group meanwhile
+            genfunc.unregister(implementation)
+            time.sleep(0.0005)
+    finally:
+        done.set()
+        for thread in callers:
+            thread.join()
+        if switch_interval is not None:
+            sys.setswitchinterval(switch_interval)
+
+    assert not errors
+
+
+def test_argument_names_clashing_with_generated_code():
+    @genericfuncs.generic
+    def genfunc(_0, isinstance, dispatch):
+        return 'default'
+
+    @genfunc.when({'_0': int, 'isinstance': int})
+    def _(dispatch):
+        return dispatch
+
+    @genfunc.when(lambda _0: _0 == 'raise')
+    def _(isinstance):
+        raise TypeError(isinstance)
+
+    assert genfunc(1, 2, 'int') == 'int'
+    assert genfunc(dispatch=3, isinstance=2, _0=1) == 3
+    assert genfunc('1', 2, 3) == 'default'
+    with pytest.raises(TypeError) as exc_info:
+        genfunc('raise', 'from implementation', None)
+    assert 'from implementation' in str(exc_info.value)
+    with pytest.raises(TypeError):
+        genfunc(1, 2)
+
+
+@pytest.mark.parametrize('dispatch_on_types', [False, True])
+def test_shared_predicates_evaluated_once_per_call(dispatch_on_types):
+    calls = []
+
+    def is_admin(user):
+        calls.append(user)
+        return user == 'admin'
+
+    def resource_is(value):
+        return lambda resource: resource == value
+
+    @genericfuncs.generic
+    def genfunc(user, resource):
+        return 'default'
+
+    for value in range(5):
+        genfunc.when([is_admin, resource_is(value)])(lambda resource: resource)
+    genfunc.when([resource_is('public'), is_admin])(lambda: 'admin')
+    genfunc.when(resource_is('public'))(lambda: 'public')
+    if dispatch_on_types:
+        genfunc.when([{'resource': float}, is_admin])(lambda: 'float')
+
+    assert genfunc('guest', 'public') == 'public'
+    assert calls == ['guest']
+    assert genfunc('admin', 3) == 3
+    assert genfunc('admin', 'public') == 'admin'
+    assert genfunc('guest', 1.5) == 'default'
+    assert calls == ['guest', 'admin', 'admin', 'guest']
+
+    # so are those of the rows of imap() and map_batch()
+    users, resources = ['guest', 'admin', 'admin', 'guest'], ['public', 3, 'public', 1.5]
+    del calls[:]
+    assert list(genfunc.imap(zip(users, resources))) == ['public', 3, 'admin', 'default']
+    assert calls == users
+    del calls[:]
+    assert genfunc.map_batch(user=users, resource=resources) == ['public', 3, 'admin', 'default']
+    assert calls == users
+
+
+@pytest.mark.parametrize('registrations', [2, 20])
+def test_value_conditions_choose_like_lambdas(registrations):
+    @genericfuncs.generic
+    def with_conditions(a, b):
+        return 'default'
+
+    @genericfuncs.generic
+    def with_lambdas(a, b):
+        return 'default'
+
+    def register(predicate, lambda_predicate, result):
+        with_conditions.when(predicate)(lambda: result)
+        with_lambdas.when(lambda_predicate)(lambda: result)
+
+    def equals(value):
+        return lambda a: a == value
+
+    def one_of(values):
+        return lambda a: a in values
+
+    def in_range(low, high):
+        def predicate(a):
+            try:
+                return (low is None or low <= a) and (high is None or a < high)
+            except TypeError:  # not comparable to the bounds
+                return False
+        return predicate
+
+    for value in range(registrations):
+        register({'a': genericfuncs.equals(value)}, equals(value), value)
+    register({'a': genericfuncs.one_of(['x', 'y', 5])}, one_of(['x', 'y', 5]), 'x or y')
+    register({'a': genericfuncs.in_range(100, 200)}, in_range(100, 200), '[100, 200)')
+    register({'a': genericfuncs.in_range(150)}, in_range(150, None), '[150, ...)')
+    register({'a': genericfuncs.in_range(high=-5)}, in_range(None, -5), '(..., -5)')
+    register({'a': genericfuncs.equals(160)}, equals(160), 'never')
+    register({'b': genericfuncs.equals(160)}, lambda b: b == 160, 'b is 160')
+    register({'a': genericfuncs.one_of([1000, 2000]), 'b': int}, lambda a, b: a in (1000, 2000) and b == int(b),
+             'int b')
+
+    for a in [0, 1, 5, 19, 20, 'x', 'z', 99, 100, 150, 160, 199.5, 200, 10 ** 9, -5, -6, float('nan'), 1000]:
+        for b in [0, 160, 0.5]:
+            assert with_conditions(a, b) == with_lambdas(a, b), (a, b)
+
+
+@pytest.mark.parametrize('others', [2, 3])
+def test_value_conditions_match_the_same_object(others):
+    nan = float('nan')  # unequal to itself, but the same object
+
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    genfunc.when(genericfuncs.equals(nan))(lambda: 'nan')
+    for value in range(others):
+        genfunc.when(genericfuncs.equals(value))(lambda: 'other')
+
+    assert genfunc(nan) == 'nan'
+    assert list(genfunc.imap([(nan,)])) == ['nan']
+    assert genfunc(float('nan')) == 'default'
+
+
+def test_value_conditions_check_all_arguments():
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    @genfunc.when(genericfuncs.equals(1))
+    def _():
+        return 'both 1'
+
+    assert genfunc(1, 1) == 'both 1'
+    assert genfunc(1, 2) == 'default'
+
+    with pytest.raises(ValueError):
+        genericfuncs.in_range()
+
+
+def test_generic_methods():
+    class Node(object):
+        pass
+
+    class Image(Node):
+        pass
+
+    class Renderer(object):
+        def __init__(self, prefix):
+            self.prefix = prefix
+
+        @genericfuncs.generic
+        def describe(self, node):  # a generic function: a plain type checks the receiver too
+            return 'default'
+
+        @describe.when(object)
+        def _describe_anything(self):
+            return self.prefix
+
+        @genericfuncs.genericmethod
+        def render(self, node):
+            return self.prefix + 'node'
+
+        @render.when(Image)
+        def _render_image(self, node):
+            return self.prefix + 'image'
+
+        @render.when(genericfuncs.equals(None))
+        def _render_nothing(self):
+            return self.prefix + 'nothing'
+
+    class TextRenderer(Renderer):
+        render = Renderer.render.extend()
+
+        @render.when({'self': Renderer, 'node': Image})
+        def _render_image(self, node):
+            return self.prefix + 'text image'
+
+    renderer, text_renderer = Renderer('html '), TextRenderer('text ')
+    assert renderer.describe(Node()) == 'html '
+    assert renderer.render(Image()) == 'html image'
+    assert renderer.render(Node()) == 'html node'
+    assert renderer.render(node=None) == 'html nothing'
+    assert Renderer.render(renderer, Image()) == 'html image'
+    assert text_renderer.render(Image()) == 'text text image'
+    assert text_renderer.render(Node()) == 'text node'
+    assert renderer.render(Image()) == 'html image'
+
+    # registrations to the base class' generic method are seen by subclasses which extended it
+    @Renderer.render.when(int)
+    def _render_int(self, node):
+        return 'int'
+    assert text_renderer.render(1) == 'int'
+
+    # only the classes of the arguments whose types are checked select dispatchers,
+    # so dispatching the instances of a subclass generates nothing more
+    assert Renderer.render(renderer, Image()) == 'html image'
+    dispatch_index = Renderer.render.memory_footprint().dispatch_index
+    assert Renderer.render(text_renderer, Image()) == 'text image'
+    assert Renderer.render.memory_footprint().dispatch_index == dispatch_index
+
+    with pytest.raises(TypeError):
+        genericfuncs.genericmethod(lambda: None)
+
+
+@pytest.mark.parametrize('dispatch_on_types', [False, True])
+def test_lazy_type_references(dispatch_on_types):
+    import sys
+    import types
+
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    @genfunc.when({'a': 'lazily_imported_module.Frame'})
+    def _frame():
+        return 'frame'
+
+    @genfunc.when(lambda a: True, type={'b': ['lazily_imported_module.Series', int]})
+    def _series():
+        return 'series'
+
+    if dispatch_on_types:
+        @genfunc.when({'b': float})
+        def _float():
+            return 'float'
+
+    class Frame(object):
+        pass
+
+    assert 'lazily_imported_module' not in sys.modules
+    assert genfunc(Frame(), None) == 'default'  # the referenced module isn't imported, so this is another Frame
+
+    # classes are defined by importing their module, after which the references to them resolve
+    module = types.ModuleType(str('lazily_imported_module'))
+    Frame = module.Frame = type(str('Frame'), (object,), {})
+    module.Series = type(str('Series'), (object,), {})
+    sys.modules['lazily_imported_module'] = module
+    try:
+        assert genfunc(Frame(), None) == 'frame'
+        assert genfunc(None, module.Series()) == 'series'
+        assert genfunc(None, 1) == 'series'
+        assert genfunc(None, None) == 'default'
+    finally:
+        del sys.modules['lazily_imported_module']
+
+    with pytest.raises(ValueError):
+        genfunc.when('Frame')
+
+
+def test_defaults_and_star_parameters():
+    @genericfuncs.generic
+    def genfunc(a, b=10, *args, **kwargs):
+        return 'default', a, b, args, kwargs
+
+    @genfunc.when(lambda b: b > 100)
+    def _(a, b, *args, **kwargs):
+        return 'large b', a, b, args, kwargs
+
+    @genfunc.when(lambda args: len(args) == 2)
+    def _(args):
+        return 'two more', args
+
+    @genfunc.when(lambda kwargs: 'flag' in kwargs)
+    def _(a, kwargs):
+        return 'flag', a, kwargs['flag']
+
+    @genfunc.when(int)  # checks a and b, not args and kwargs
+    def _(a, b):
+        return 'ints', a, b
+
+    assert genfunc('x') == ('default', 'x', 10, (), {})
+    assert genfunc('x', 200, 1) == ('large b', 'x', 200, (1,), {})
+    assert genfunc('x', 0, 1, 2) == ('two more', (1, 2))
+    assert genfunc('x', flag=True) == ('flag', 'x', True)
+    assert genfunc(1) == ('ints', 1, 10)
+    assert genfunc(1, b=2, c=3) == ('ints', 1, 2)
+    assert genfunc(b=2, a='x', c=3) == ('default', 'x', 2, (), {'c': 3})
+    assert list(genfunc.imap([('x',), (1, 2)])) == [('default', 'x', 10, (), {}), ('ints', 1, 2)]
+
+    with pytest.raises(TypeError) as exc_info:
+        genfunc()
+    assert 'missing required arguments' in str(exc_info.value)
+    with pytest.raises(TypeError) as exc_info:
+        genfunc('x', a=1)
+    assert 'got multiple values for' in str(exc_info.value)
+
+
+@pytest.mark.skipif(sys.version_info[0] < 3, reason='keyword-only parameters are new in python 3')
+def test_keyword_only_parameters():
+    # defined via exec(), to keep this module importable on Python 2
+    namespace = {}
+    exec('''
+def base(a, *, key=None, reverse=False):
+    return 'default'
+
+def by_key(a, *, key):
+    return 'by key ' + key
+''', namespace)
+
+    genfunc = genericfuncs.generic(namespace['base'])
+    genfunc.when(lambda key: key is not None)(namespace['by_key'])
+
+    @genfunc.when(lambda reverse: reverse)
+    def _(a):
+        return 'reversed'
+
+    assert genfunc(1) == 'default'
+    assert genfunc(1, key='k') == 'by key k'
+    assert genfunc(1, reverse=True) == 'reversed'
+    assert list(genfunc.imap_kwargs([{'a': 1}, {'a': 1, 'key': 'k'}])) == ['default', 'by key k']
+    with pytest.raises(ValueError):
+        genfunc(1, 'k')
+
+
+def test_analyze():
+    class Animal(object):
+        pass
+
+    class Cat(Animal):
+        pass
+
+    class Dog(Animal):
+        pass
+
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    def register(predicate, **options):
+        def implementation():
+            pass
+        genfunc.when(predicate, **options)(implementation)
+        return implementation
+
+    by_callable = register(lambda a: a)
+    cat = register({'a': Cat})
+    int_str = register({'a': int, 'b': str})
+    animal = register({'a': Animal})
+    dog = register({'a': Dog})
+    cat_conditionally = register([{'a': Cat}, lambda b: b])
+    int_anything = register({'a': int}, type={'b': [int, float]})
+    bytes_number = register({'a': bytes}, type=[int, float])
+    cat_b = register({'b': Cat})
+
+    analysis = genfunc.analyze()
+    assert analysis.shadowed == [(dog, animal), (cat_conditionally, cat)]
+    assert (int_anything, int_str) in analysis.disjoint  # b can't be both a string and a number
+    assert (int_str, cat) in analysis.overlapping  # an argument may derive from both int and Cat
+    assert (cat_b, cat) in analysis.overlapping
+    assert (bytes_number, int_anything) in analysis.disjoint  # int and bytes are built-in, so they can't mix
+    assert (animal, int_str) in analysis.overlapping
+    assert all(by_callable not in pair for pairs in analysis for pair in pairs)
+    assert len(analysis.shadowed) + len(analysis.disjoint) + len(analysis.overlapping) == 8 * 7 // 2
+
+
+@pytest.mark.parametrize('pure', [False, True])
+def test_unmatched_classes_fall_through_to_default(pure):
+    @genericfuncs.generic(pure=pure)
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(int)
+    def _(a):
+        return 'int'
+
+    classes = [type(str('Unknown{}'.format(index)), (object,), {}) for index in range(1100)]
+    assert genfunc(classes[0]()) == 'default'
+    assert genfunc(1) == 'int'
+
+    # classes no registration may match share what dispatches them, so each one adds little more than its key
+    footprints = []
+    for start in range(1, 1001, 500):
+        for cls in classes[start:start + 500]:
+            assert genfunc(cls()) == 'default'
+        footprints.append(genfunc.memory_footprint().dispatch_index)
+    assert (footprints[1] - footprints[0]) / 500 < 300
+
+    # and only so many classes are kept
+    for cls in classes[1001:]:
+        assert genfunc(cls()) == 'default'
+    assert genfunc.memory_footprint().dispatch_index < footprints[1]
+
+    @genfunc.when(lambda a: isinstance(a, classes[0]))
+    def _():
+        return 'unknown 0'
+    assert genfunc(classes[0]()) == 'unknown 0'
+
+
+@pytest.mark.parametrize('options', [{}, {'pure': True}])
+def test_unregister(options):
+    @genericfuncs.generic(**options)
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(int)
+    def _int(a):
+        return 'int'
+
+    @genfunc.when(float)
+    def _float(a):
+        return 'float'
+
+    @genfunc.when(lambda a: a == 2)  # shadowed, so only removed by unregistering _int
+    def _two(a):
+        return 'two'
+
+    assert genfunc(1) == 'int'
+    assert genfunc(2) == 'int'
+    assert genfunc(0.5) == 'float'
+
+    genfunc.unregister(_int)
+    assert genfunc(1) == 'default'
+    assert genfunc(2) == 'two'
+    assert genfunc(0.5) == 'float'
+
+    with pytest.raises(ValueError):
+        genfunc.unregister(_int)
+
+    genfunc.freeze()
+    with pytest.raises(ValueError):
+        genfunc.unregister(_float)
+
+
+def test_unregister_drops_cached_decisions():
+    import gc
+
+    @genericfuncs.generic(pure=True)
+    def genfunc(a):
+        return 'default'
+
+    @genfunc.when(lambda a: a == 1)
+    def _one(a):
+        return 'one'
+
+    @genfunc.when(lambda a: a == 2)
+    def _two(a):
+        return 'two'
+
+    def handle_three(a):
+        return 'three'
+    genfunc.when(lambda a: a == 3, weak=True)(handle_three)
+
+    assert [genfunc(a) for a in (1, 2, 3, 4)] == ['one', 'two', 'three', 'default']
+    genfunc.unregister(_one)
+    genfunc.unregister(_two)  # its decision was cached before the previous removal
+    assert [genfunc(a) for a in (1, 2, 3, 4)] == ['default', 'default', 'three', 'default']
+
+    genfunc.when(lambda a: a == 1)(_one)
+    assert genfunc(1) == 'one'
+    genfunc.unregister(_one)
+    del handle_three
+    gc.collect()
+    assert [genfunc(a) for a in (1, 2, 3, 4)] == ['default'] * 4
+    assert genfunc.cache_info().currsize == 4
+
+
+def test_registered():
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    def debug(a):
+        return 'debug'
+
+    @genfunc.when(lambda a: a > 0)
+    def _positive(a):
+        return 'positive'
+
+    with genfunc.registered(lambda a: a == 1, debug) as implementation:
+        assert implementation is debug
+        assert genfunc(1) == 'positive'
+        genfunc.when(lambda a: a < 0)(debug)  # registered outside of the block, so kept
+        assert genfunc(-1) == 'debug'
+    assert genfunc(-1) == 'debug'
+
+    with genfunc.registered(lambda a: a == 1, debug):
+        genfunc.unregister(_positive)
+        assert genfunc(1) == 'debug'
+    assert genfunc(1) == 'default'
+    assert genfunc.memory_footprint().registrations == 1
+
+
+def test_weak_implementations():
+    import gc
+
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    class Plugin(object):
+        def accepts(self, a):
+            return a == 'plugin'
+
+        def handle(self, a):
+            return 'handled by plugin'
+
+    plugin = Plugin()
+    genfunc.when(plugin.accepts, weak=True)(plugin.handle)
+
+    def handle_one(a):
+        return 'one'
+    genfunc.when(lambda a: a == 1, weak=True)(handle_one)
+
+    @genfunc.when(lambda a: a == 2)
+    def _two(a):
+        return 'two'
+
+    assert genfunc('plugin') == 'handled by plugin'
+    assert genfunc(1) == 'one'
+
+    del plugin, handle_one
+    gc.collect()
+    assert genfunc('plugin') == 'default'
+    assert genfunc(1) == 'default'
+    assert genfunc(2) == 'two'
+    assert genfunc.memory_footprint().registrations == 1
+
+
+def test_cheapest_first_evaluation():
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    evaluated = []
+
+    def in_cache_file(a):
+        evaluated.append('cache file')
+        return a == 1
+
+    def positive(a):
+        evaluated.append('positive')
+        return a > 0
+
+    @genfunc.when([in_cache_file, {'a': int}])
+    def _cached(a):
+        return 'cached'
+
+    assert genfunc.map_batch(a=[0.5, 1], b=[0, 0]) == ['default', 'cached']
+    assert evaluated == ['cache file']  # the type check excluded 0.5 first
+
+    # predicates which aren't hinted keep their order, and hinted ones are ordered by cost and selectivity
+    predicate = genfunc.make_predicate([positive, in_cache_file, {'b': int}])
+    del evaluated[:]
+    assert not predicate(1, 'x')
+    assert evaluated == []  # the type check is evaluated first
+    assert predicate(1, 0)
+    assert evaluated == ['positive', 'cache file']
+    predicate = genfunc.make_predicate([genericfuncs.hint(in_cache_file, cost=500),
+                                        genericfuncs.hint(positive, cost=2)])
+    del evaluated[:]
+    assert not predicate(-1, 0)
+    assert evaluated == ['positive']
+    predicate = genfunc.make_predicate([genericfuncs.hint(positive, cost=5, selectivity=0.9),
+                                        genericfuncs.hint(in_cache_file, cost=5, selectivity=0.1)])
+    del evaluated[:]
+    assert predicate(1, 0)
+    assert evaluated == ['cache file', 'positive']
+    assert 0 < predicate.selectivity < 0.1
+
+    # a hinted predicate may be evaluated before the type check given as `type`
+    def b_is_true(b):
+        evaluated.append('b')
+        return b
+    predicate = genfunc.make_predicate(genericfuncs.hint(b_is_true, cost=0.1), prepend_typecheck={'a': int})
+    del evaluated[:]
+    assert not predicate('x', 1)
+    assert evaluated == ['b']
+
+    @genfunc.when(lambda a: a == 2, type={'a': int}, cost=0.5)
+    def _two(a):
+        return 'two'
+    assert genfunc(2, 0) == 'two'
+
+    # ready predicates aren't changed by hinting them
+    type_check = genfunc.make_predicate({'a': int})
+    assert genfunc.make_predicate(genericfuncs.hint(type_check, cost=3)).cost == 3
+    assert type_check.cost == 1
+
+    with pytest.raises(ValueError):
+        genericfuncs.hint(positive, cost=-1)
+    with pytest.raises(ValueError):
+        genfunc.when(positive, selectivity=2)
+
+
+def test_memoize():
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    computed = []
+
+    @genfunc.when(lambda a: a > 0, memoize=2)
+    def _positive(a):
+        computed.append(a)
+        return a * 2
+
+    @genfunc.when(lambda a: a < 0)
+    def _negative(a):
+        computed.append(a)
+        return a
+
+    assert genfunc(1, 'x') == 2
+    assert genfunc(1, 'y') == 2  # b isn't injected, so it doesn't take part in the key
+    assert genfunc(1.0, 'x') == 2.0
+    assert genfunc(-1, 'x') == genfunc(-1, 'x') == -1
+    assert genfunc(2, 'x') == 4  # evicts 1
+    assert genfunc(1, 'x') == 2
+    assert computed == [1, 1.0, -1, -1, 2, 1]
+    assert genfunc.memo_info() == [(_positive, 1, 4, 2, 2)]
+
+    genfunc.memo_clear(_positive)
+    assert genfunc.memo_info() == [(_positive, 0, 0, 2, 0)]
+    with pytest.raises(ValueError):
+        genfunc.memo_clear(lambda: None)
+    with pytest.raises(ValueError):
+        genfunc.when(lambda a: a == 0, memoize=0)
+
+    @genericfuncs.generic(memoize=True, memoize_ttl=0.05)
+    def expiring(a, b):
+        return 'default'
+
+    @expiring.when(lambda b: b)
+    def _(a):
+        computed.append(a)
+        return [a]
+
+    del computed[:]
+    assert expiring([1], True) == [[1]]  # unhashable, so not memoized
+    assert expiring(1, True) is expiring(1, True)
+    time.sleep(0.1)
+    assert expiring(1, True) == [1]
+    assert computed == [[1], 1, 1]
+    assert expiring.memo_info()[0].maxsize == 128
+    assert expiring.memory_footprint().memoized_results > 0
+
+
+def test_memoize_default_implementation():
+    computed = []
+
+    def base(a, b=1):
+        computed.append(a)
+        return a + b
+
+    genfunc = genericfuncs.generic(base, memoize=True)
+    genfunc.when(lambda a: a < 0)(lambda a: -a)
+
+    assert genfunc(1) == genfunc(1) == genfunc(1, b=1) == 2
+    assert genfunc(-1) == 1
+    assert list(genfunc.imap([(1, 1), (2, 1)])) == [2, 3]
+    assert computed == [1, 2]
+    assert genfunc.memo_info()[0] == (base, 3, 2, 128, 2)
+
+    genfunc.memo_clear(base)
+    assert genfunc.memo_info()[0] == (base, 0, 0, 128, 0)
+    assert genfunc(1) == 2
+    assert computed == [1, 2, 1]
+
+
+def test_registering_many_implementations():
+    import gc
+    timer = getattr(time, 'perf_counter', time.time)
+
+    @genericfuncs.generic
+    def genfunc(a, b):
+        return 'default'
+
+    def returns(value):
+        return lambda: value
+
+    def register(values):
+        start = timer()
+        for value in values:
+            if value % 1000 == 999:
+                genfunc.when({'b': int}, group='types')(returns('int b'))
+            else:
+                genfunc.when({'a': genericfuncs.equals(value)})(returns(value))
+        return timer() - start
+
+    gc.disable()  # whose full collections take longer as more objects are alive
+    try:
+        times = [register(range(start, start + 500)) for start in range(0, 20000, 500)]
+    finally:
+        gc.enable()
+    # registering takes as long however many implementations are registered already
+    assert min(times[-5:]) < 3 * min(times[1:6])
+
+    assert genfunc(19998, 'x') == 19998
+    assert genfunc(500, 1) == 500
+    assert genfunc(1500, 1) == 'int b'  # the group is evaluated at the position of its first registration
+    assert genfunc(-1, 1) == 'int b'
+    assert genfunc(-1, 'x') == 'default'
+
+
+@pytest.mark.skipif(genericfuncs.asyncio is not None, reason='asyncio is available')
+def test_call_async_requires_asyncio():
+    @genericfuncs.generic
+    def genfunc(a):
+        return 'default'
+
+    with pytest.raises(RuntimeError):
+        genfunc.call_async(1)
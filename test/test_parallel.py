@@ -0,0 +1,76 @@
+from __future__ import unicode_literals
+from __future__ import division
+
+import pickle
+import sys
+
+import pytest
+import genericfuncs
+
+
+@genericfuncs.generic
+def genfunc(a, b):
+    return 'default'
+
+
+@genfunc.when({'a': int, 'b': int})
+def _(a, b):
+    return a * b
+
+
+@genfunc.when(lambda a, b: a == b)
+def _(a):
+    return 'equal'
+
+
+class Renderer(object):
+    @genericfuncs.genericmethod
+    def render(self, node):
+        return 'node'
+
+
+class TextRenderer(Renderer):
+    render = Renderer.render.extend()
+
+    @render.when(int)
+    def _(self, node):
+        return 'text'
+
+
+def expected_results(calls):
+    return [a * b if isinstance(a, int) and isinstance(b, int) else 'equal' if a == b else 'default'
+            for a, b in calls]
+
+
+def test_generic_pickled_by_reference():
+    assert pickle.loads(pickle.dumps(genfunc)) is genfunc
+    assert genfunc.__name__ == 'genfunc'
+
+    unnamed = genericfuncs.generic(lambda a: None)
+    vars(unnamed).pop('__qualname__', None)
+    del unnamed.__name__
+    with pytest.raises(pickle.PicklingError):
+        pickle.dumps(unnamed)
+
+
+@pytest.mark.skipif(sys.version_info < (3, 6), reason='methods are pickled by their qualified name')
+def test_generic_methods_pickled_by_reference():
+    assert pickle.loads(pickle.dumps(Renderer.render)) is Renderer.render
+    # extending takes the name the extension is assigned to
+    assert TextRenderer.render.__qualname__ == 'TextRenderer.render'
+    assert pickle.loads(pickle.dumps(TextRenderer.render)) is TextRenderer.render
+    assert TextRenderer().render(1) == 'text'
+
+
+@pytest.mark.parametrize('executor_name', ['ThreadPoolExecutor', 'ProcessPoolExecutor'])
+def test_map_parallel(executor_name):
+    executor_class = getattr(pytest.importorskip('concurrent.futures'), executor_name)
+    calls = [(n, n % 7) for n in range(500)] + [('x', 'x'), ('x', 1.5)] + [(1.5, 1.5)] * 10
+
+    with executor_class(max_workers=2) as executor:
+        results = genfunc.map_parallel(calls, executor, chunk_size=32, max_pending=3)
+        assert list(results) == expected_results(calls)
+        assert list(genfunc.map_parallel([], executor)) == []
+
+        with pytest.raises(ValueError):
+            list(genfunc.map_parallel([(1, 2, 3)], executor))